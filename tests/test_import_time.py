@@ -0,0 +1,42 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Importing the server must stay cheap, so it can answer `initialize` right
+# away; these are only loaded when first needed.
+HEAVY_MODULES = ["crawl4ai", "playwright", "marker", "torch"]
+
+# Seconds the import itself may take, measured in the child so interpreter
+# startup doesn't count
+IMPORT_BUDGET_SECONDS = 2.0
+
+
+def test_import_is_fast_and_does_not_load_heavy_dependencies(tmp_path):
+    pytest.importorskip("mcp")
+    code = (
+        "import json, sys, time\n"
+        "started = time.perf_counter()\n"
+        "import webscraper\n"
+        "elapsed = time.perf_counter() - started\n"
+        f"loaded = [m for m in {HEAVY_MODULES!r} if m in sys.modules]\n"
+        "print(json.dumps({'elapsed': elapsed, 'loaded': loaded}))\n"
+    )
+    # Keep the import away from the user's real cache
+    env = dict(os.environ, WEBSCRAPER_CACHE_DIR=str(tmp_path))
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    assert report["loaded"] == []
+    assert report["elapsed"] < IMPORT_BUDGET_SECONDS, f"import took {report['elapsed']:.2f}s"
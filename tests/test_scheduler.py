@@ -0,0 +1,164 @@
+import asyncio
+
+import pytest
+
+from utils.scheduler import BACKGROUND, BATCH, INTERACTIVE, Lane, Overloaded, priority
+from utils.singleflight import SingleFlight
+
+
+async def _hold(lane, order, name, release, level=None):
+    async with lane.slot(level):
+        order.append(name)
+        await release.wait()
+
+
+async def _settle():
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+
+def test_slot_is_handed_to_waiters_in_priority_order():
+    async def run():
+        lane = Lane("test", 1, max_queue=10)
+        order = []
+        release = asyncio.Event()
+        holder = asyncio.ensure_future(_hold(lane, order, "holder", release))
+        await _settle()
+        waiters = [
+            asyncio.ensure_future(_hold(lane, order, name, release, level))
+            for name, level in (("background", BACKGROUND), ("batch", BATCH), ("interactive", INTERACTIVE))
+        ]
+        await _settle()
+        assert lane.stats()["queued"] == 2
+        assert lane.stats()["queued_background"] == 1
+        release.set()
+        await asyncio.gather(holder, *waiters)
+        assert order == ["holder", "interactive", "batch", "background"]
+        assert lane.stats() == {"active": 0, "queued": 0, "queued_background": 0, "concurrency": 1}
+
+    asyncio.run(run())
+
+
+def test_full_queue_rejects_interactive_but_not_background():
+    async def run():
+        lane = Lane("test", 1, max_queue=1)
+        release = asyncio.Event()
+        order = []
+        holder = asyncio.ensure_future(_hold(lane, order, "holder", release))
+        queued = asyncio.ensure_future(_hold(lane, order, "queued", release))
+        await _settle()
+        with pytest.raises(Overloaded):
+            async with lane.slot(INTERACTIVE):
+                pass
+        background = asyncio.ensure_future(_hold(lane, order, "background", release, BACKGROUND))
+        await _settle()
+        assert not background.done()
+        release.set()
+        await asyncio.gather(holder, queued, background)
+        assert order == ["holder", "queued", "background"]
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def run():
+        lane = Lane("test", 1, max_queue=10)
+        release = asyncio.Event()
+        order = []
+        holder = asyncio.ensure_future(_hold(lane, order, "holder", release))
+        cancelled = asyncio.ensure_future(_hold(lane, order, "cancelled", release))
+        await _settle()
+        cancelled.cancel()
+        await _settle()
+        assert lane.stats()["queued"] == 0
+        release.set()
+        await holder
+        assert order == ["holder"]
+        assert lane.stats()["active"] == 0
+
+    asyncio.run(run())
+
+
+def test_slot_handed_to_a_cancelled_waiter_is_passed_on():
+    async def run():
+        lane = Lane("test", 1, max_queue=10)
+        order = []
+        first_release = asyncio.Event()
+        release = asyncio.Event()
+
+        async def hand_over_then_cancel():
+            await _hold(lane, order, "holder", first_release)
+            # The slot was just handed over; cancel the waiter before it runs
+            cancelled.cancel()
+
+        holder = asyncio.ensure_future(hand_over_then_cancel())
+        cancelled = asyncio.ensure_future(_hold(lane, order, "cancelled", release))
+        last = asyncio.ensure_future(_hold(lane, order, "last", release))
+        await _settle()
+        first_release.set()
+        await holder
+        release.set()
+        await last
+        assert cancelled.cancelled()
+        assert order == ["holder", "last"]
+        assert lane.stats()["active"] == 0
+
+    asyncio.run(run())
+
+
+def test_joining_a_background_flight_raises_its_priority():
+    async def run():
+        lane = Lane("test", 1, max_queue=10)
+        flights = SingleFlight()
+        order = []
+        release = asyncio.Event()
+
+        async def fetch(name):
+            async with lane.slot():
+                order.append(name)
+
+        async def call(key, name, level):
+            with priority(level):
+                await flights.do(key, lambda: fetch(name))
+
+        holder = asyncio.ensure_future(_hold(lane, order, "holder", release))
+        await _settle()
+        calls = [
+            asyncio.ensure_future(call("shared", "shared", BACKGROUND)),
+            asyncio.ensure_future(call("other", "batch", BATCH)),
+        ]
+        await _settle()
+        calls.append(asyncio.ensure_future(call("shared", "shared", INTERACTIVE)))
+        await _settle()
+        assert lane.stats()["queued_background"] == 0
+        release.set()
+        await asyncio.gather(holder, *calls)
+        assert order == ["holder", "shared", "batch"]
+
+    asyncio.run(run())
+
+
+def test_flight_waiting_for_background_room_is_raised():
+    async def run():
+        lane = Lane("test", 1, max_queue=10, max_background_queue=1)
+        flights = SingleFlight()
+        order = []
+        release = asyncio.Event()
+
+        async def call(level):
+            with priority(level):
+                await flights.do("key", lambda: _hold(lane, order, "flight", release))
+
+        holder = asyncio.ensure_future(_hold(lane, order, "holder", release))
+        queued = asyncio.ensure_future(_hold(lane, order, "background", release, BACKGROUND))
+        await _settle()
+        calls = [asyncio.ensure_future(call(BACKGROUND))]
+        await _settle()
+        calls.append(asyncio.ensure_future(call(INTERACTIVE)))
+        await _settle()
+        assert lane.stats()["queued"] == 1
+        release.set()
+        await asyncio.gather(holder, queued, *calls)
+        assert order == ["holder", "flight", "background"]
+
+    asyncio.run(run())
@@ -0,0 +1,160 @@
+import asyncio
+import importlib
+import sys
+from contextlib import asynccontextmanager
+
+# Playwright errors meaning the browser process died or the connection to it
+# was lost, rather than that a page failed to load
+_DISCONNECTED_ERRORS = (
+    "target closed",
+    "browser has been closed",
+    "browser has disconnected",
+    "connection closed",
+)
+
+
+def _is_connected(crawler):
+    """
+    Returns:
+        bool: False if the crawler's browser is known to be gone
+    """
+    strategy = getattr(crawler, "crawler_strategy", None)
+    # Newer crawl4ai keeps the browser on a BrowserManager
+    browser = getattr(getattr(strategy, "browser_manager", strategy), "browser", None)
+    is_connected = getattr(browser, "is_connected", None)
+    if is_connected is None:
+        return True
+    try:
+        return bool(is_connected())
+    except Exception:
+        return False
+
+
+def _looks_disconnected(error):
+    message = str(error).lower()
+    return any(text in message for text in _DISCONNECTED_ERRORS)
+
+
+class CrawlerPool:
+    """
+    A long lived pool of crawl4ai browsers shared by every tool call.
+
+    Each browser is started once and handed out up to `pages_per_browser`
+    times concurrently, so callers borrow a page slot instead of paying for a
+    full Chromium launch and teardown on every request. A browser that
+    crashed or disconnected is replaced the first time a borrower fails on it.
+    """
+
+    def __init__(self, browsers=1, pages_per_browser=4):
+        """
+        Args:
+            browsers (int): Number of browser instances to launch
+            pages_per_browser (int): Concurrent pages allowed per browser
+        """
+        self.browsers = max(1, browsers)
+        self.pages_per_browser = max(1, pages_per_browser)
+        self._crawlers = []
+        self._slots = None
+        # Dead crawler -> the one that replaced it; their slots still in the
+        # queue or out with borrowers are redirected as they come by
+        self._replacements = {}
+        self._lock = asyncio.Lock()
+
+    @property
+    def started(self):
+        return self._slots is not None
+
+    async def start(self):
+        """
+        Launch the browsers. Safe to call more than once.
+        """
+        async with self._lock:
+            if self.started:
+                return
+            # Imported here so the server starts without loading playwright,
+            # and on a thread so the import doesn't hold up the event loop
+            # while the server answers `initialize`
+            crawl4ai = await asyncio.to_thread(importlib.import_module, "crawl4ai")
+            AsyncWebCrawler = crawl4ai.AsyncWebCrawler
+
+            slots = asyncio.Queue()
+            try:
+                for _ in range(self.browsers):
+                    crawler = AsyncWebCrawler()
+                    await crawler.start()
+                    self._crawlers.append(crawler)
+                    for _ in range(self.pages_per_browser):
+                        slots.put_nowait(crawler)
+            except Exception:
+                await self._close_crawlers()
+                raise
+            self._slots = slots
+            print(
+                f"Crawler pool started with {self.browsers} browser(s) x "
+                f"{self.pages_per_browser} page(s)",
+                file=sys.stderr,
+            )
+
+    @asynccontextmanager
+    async def borrow(self):
+        """
+        Borrow a crawler for a single page load, starting the pool on first use.
+
+        Yields:
+            AsyncWebCrawler: a started crawler; it goes back to the pool on exit
+        """
+        if not self.started:
+            await self.start()
+        # Kept locally, close() may drop the queue while the page is loading
+        slots = self._slots
+        crawler = self._current(await slots.get())
+        try:
+            yield crawler
+        except Exception as e:
+            if _looks_disconnected(e) or not _is_connected(crawler):
+                await self._replace(crawler)
+            raise
+        finally:
+            slots.put_nowait(self._current(crawler))
+
+    def _current(self, crawler):
+        while crawler in self._replacements:
+            crawler = self._replacements[crawler]
+        return crawler
+
+    async def _replace(self, crawler):
+        async with self._lock:
+            if crawler in self._replacements or crawler not in self._crawlers:
+                # Replaced by another borrower already, or the pool was closed
+                return
+            print("Crawler browser disconnected, starting a new one", file=sys.stderr)
+            crawl4ai = importlib.import_module("crawl4ai")
+            replacement = crawl4ai.AsyncWebCrawler()
+            try:
+                await replacement.start()
+            except Exception as e:
+                print(f"Error replacing crawler: {e}", file=sys.stderr)
+                return
+            self._crawlers[self._crawlers.index(crawler)] = replacement
+            self._replacements[crawler] = replacement
+        try:
+            await crawler.close()
+        except Exception as e:
+            print(f"Error closing crawler: {e}", file=sys.stderr)
+
+    async def close(self):
+        """
+        Shut down every browser in the pool.
+        """
+        async with self._lock:
+            self._slots = None
+            self._replacements = {}
+            await self._close_crawlers()
+
+    async def _close_crawlers(self):
+        crawlers, self._crawlers = self._crawlers, []
+        for crawler in crawlers:
+            try:
+                await crawler.close()
+            except Exception as e:
+                print(f"Error closing crawler: {e}", file=sys.stderr)
@@ -0,0 +1,262 @@
+import asyncio
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from utils import metrics
+from utils.urls import canonicalize_url
+
+
+@dataclass
+class CacheEntry:
+    value: str
+    stored_at: float
+    etag: str = None
+    last_modified: str = None
+
+    @property
+    def age(self):
+        return time.time() - self.stored_at
+
+    def conditional_headers(self):
+        """
+        Returns:
+            dict: If-None-Match / If-Modified-Since headers to revalidate the entry
+        """
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResultCache:
+    """
+    Tool results keyed by tool name and canonical URL.
+
+    Entries live in an in-memory LRU bounded by total size in bytes, backed
+    by a sqlite database on disk so results survive restarts. Each tool has
+    its own time to live.
+    """
+
+    def __init__(self, directory, memory_limit, ttls, default_ttl=3600):
+        """
+        Args:
+            directory (str): Directory for the on-disk tier, or None to keep results in memory only
+            memory_limit (int): Maximum size in bytes of the in-memory tier
+            ttls (dict): Time to live in seconds per tool name
+            default_ttl (int): Time to live for tools missing from `ttls`
+        """
+        self.memory_limit = memory_limit
+        self.ttls = dict(ttls)
+        self.default_ttl = default_ttl
+        self._memory = OrderedDict()
+        self._sizes = {}
+        self._memory_size = 0
+        self._lock = threading.Lock()
+        # Guards the sqlite connection, which is written from worker threads
+        self._db_lock = threading.Lock()
+        self._db = None
+        if directory:
+            try:
+                os.makedirs(directory, exist_ok=True)
+                self._db = sqlite3.connect(
+                    os.path.join(directory, "results.sqlite3"),
+                    check_same_thread=False,
+                )
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS results ("
+                    "key TEXT PRIMARY KEY, tool TEXT, value TEXT, stored_at REAL, "
+                    "etag TEXT, last_modified TEXT)"
+                )
+                # Databases created before validators were stored
+                columns = {row[1] for row in self._db.execute("PRAGMA table_info(results)")}
+                for column in ("etag", "last_modified"):
+                    if column not in columns:
+                        self._db.execute(f"ALTER TABLE results ADD COLUMN {column} TEXT")
+                self._db.commit()
+            except (OSError, sqlite3.Error) as e:
+                print(f"Disk cache disabled: {e}", file=sys.stderr)
+                self._db = None
+
+    def key(self, tool, url, variant=""):
+        """
+        Build the cache key for a tool call.
+
+        Args:
+            tool (str): tool name, e.g. "web", "pdf" or "youtube"
+            url (str): URL the tool was called with
+            variant (str): Optional extra arguments that change the result
+
+        Returns:
+            str: the cache key
+        """
+        key = f"{tool}:{canonicalize_url(url)}"
+        if variant:
+            key = f"{key}#{variant}"
+        return key
+
+    def ttl(self, tool):
+        return self.ttls.get(tool, self.default_ttl)
+
+    def lookup(self, tool, url, variant=""):
+        """
+        Return the stored entry for a call whether or not it has expired.
+
+        Returns:
+            CacheEntry: the entry, or None if nothing is stored
+        """
+        key = self.key(tool, url, variant)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return entry
+        entry = self._load(key)
+        if entry is not None:
+            with self._lock:
+                self._remember(key, entry)
+        return entry
+
+    def is_fresh(self, tool, entry):
+        """
+        Args:
+            tool (str): tool name the entry was stored under
+            entry (CacheEntry): an entry returned by lookup
+
+        Returns:
+            bool: whether the entry is still within its time to live
+        """
+        return entry.age <= self.ttl(tool)
+
+    async def put(self, tool, url, value, variant="", validators=None):
+        """
+        Store a result in both tiers. The disk write runs on a worker
+        thread, since results can be several megabytes.
+
+        Args:
+            tool (str): tool name
+            url (str): URL the tool was called with
+            value (str): the tool output
+            variant (str): Optional extra arguments that change the result
+            validators (dict): Optional "etag" and "last_modified" of the fetched document
+        """
+        validators = validators or {}
+        entry = CacheEntry(
+            value=value,
+            stored_at=time.time(),
+            etag=validators.get("etag"),
+            last_modified=validators.get("last_modified"),
+        )
+        await self._store(self.key(tool, url, variant), tool, entry)
+
+    async def refresh(self, tool, url, entry, variant=""):
+        """
+        Mark an entry as fresh again after the origin confirmed it is unchanged.
+
+        Args:
+            tool (str): tool name
+            url (str): URL the tool was called with
+            entry (CacheEntry): the entry that was revalidated
+            variant (str): Optional extra arguments that change the result
+        """
+        metrics.incr(f"cache.{tool}.revalidated")
+        await self._store(
+            self.key(tool, url, variant),
+            tool,
+            CacheEntry(entry.value, time.time(), entry.etag, entry.last_modified),
+        )
+
+    async def _store(self, key, tool, entry):
+        with self._lock:
+            self._remember(key, entry)
+        if self._db is not None:
+            await asyncio.to_thread(self._write, key, tool, entry)
+
+    def _write(self, key, tool, entry):
+        with self._db_lock:
+            if self._db is None:
+                return
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, tool, entry.value, entry.stored_at, entry.etag, entry.last_modified),
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"Error writing disk cache: {e}", file=sys.stderr)
+
+    def prune(self, max_stale=0, keep_validated=0):
+        """
+        Delete expired results from the disk tier.
+
+        Args:
+            max_stale (int): seconds past their TTL results may still be served stale
+            keep_validated (int): extra seconds to keep results that have an
+                ETag or Last-Modified, which can still be revalidated cheaply
+        """
+        if self._db is None:
+            return
+        now = time.time()
+        with self._db_lock:
+            tools = [row[0] for row in self._db.execute("SELECT DISTINCT tool FROM results")]
+            for tool in tools:
+                expired = now - self.ttl(tool) - max_stale
+                self._db.execute(
+                    "DELETE FROM results WHERE tool = ? AND stored_at < ? AND "
+                    "((etag IS NULL AND last_modified IS NULL) OR stored_at < ?)",
+                    (tool, expired, expired - keep_validated),
+                )
+            self._db.commit()
+
+    def stats(self):
+        """
+        Returns:
+            dict: entry count and size of the in-memory tier
+        """
+        with self._lock:
+            return {
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_size,
+                "disk": self._db is not None,
+            }
+
+    def close(self):
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _load(self, key):
+        with self._db_lock:
+            if self._db is None:
+                return None
+            try:
+                row = self._db.execute(
+                    "SELECT value, stored_at, etag, last_modified FROM results WHERE key = ?", (key,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                print(f"Error reading disk cache: {e}", file=sys.stderr)
+                return None
+        if row is None:
+            return None
+        return CacheEntry(*row)
+
+    def _remember(self, key, entry):
+        size = len(entry.value.encode("utf-8"))
+        if key in self._memory:
+            del self._memory[key]
+            self._memory_size -= self._sizes.pop(key)
+        if size > self.memory_limit:
+            return
+        self._memory[key] = entry
+        self._sizes[key] = size
+        self._memory_size += size
+        while self._memory_size > self.memory_limit:
+            evicted, _ = self._memory.popitem(last=False)
+            self._memory_size -= self._sizes.pop(evicted)
@@ -0,0 +1,114 @@
+import base64
+import binascii
+import json
+import re
+
+# Rough size of a token in English text, used to turn max_tokens into characters
+CHARS_PER_TOKEN = 4
+
+_HEADING_RE = re.compile(r"\n(?=#{1,6}\s)")
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+
+
+def chunk_limit(max_chars=None, max_tokens=None):
+    """
+    Combine the size limits a caller may pass into a number of characters.
+
+    Args:
+        max_chars (int): Optional maximum number of characters
+        max_tokens (int): Optional maximum number of tokens
+
+    Returns:
+        int: the tighter of the two limits, or None when neither is given
+    """
+    limits = []
+    if max_chars is not None:
+        limits.append(max_chars)
+    if max_tokens is not None:
+        limits.append(max_tokens * CHARS_PER_TOKEN)
+    if not limits:
+        return None
+    limit = min(limits)
+    if limit <= 0:
+        raise ValueError("max_chars and max_tokens must be positive")
+    return limit
+
+
+def split_chunk(text, offset, max_chars):
+    """
+    Cut the next chunk of at most `max_chars` characters out of `text`.
+
+    The chunk ends before the last heading in the window, or failing that
+    after the last paragraph, line or word, as long as that keeps the chunk
+    at least half the size asked for. Chunks put back together give the
+    original text.
+
+    Args:
+        text (str): the whole document
+        offset (int): where the chunk starts
+        max_chars (int): maximum chunk size
+
+    Returns:
+        tuple: (chunk, next_offset) where next_offset is None at the end
+    """
+    end = offset + max_chars
+    if end >= len(text):
+        return text[offset:], None
+    window = text[offset:end]
+    cut = None
+    for find in (_last_heading, _last_paragraph, _last_line, _last_space):
+        position = find(window)
+        if position is not None and position >= max_chars // 2:
+            cut = position
+            break
+    if cut is None:
+        cut = max_chars
+    return window[:cut], offset + cut
+
+
+def _last_heading(window):
+    matches = list(_HEADING_RE.finditer(window))
+    return matches[-1].end() if matches else None
+
+
+def _last_paragraph(window):
+    matches = list(_PARAGRAPH_RE.finditer(window))
+    return matches[-1].end() if matches else None
+
+
+def _last_line(window):
+    position = window.rfind("\n")
+    return position + 1 if position > 0 else None
+
+
+def _last_space(window):
+    position = window.rfind(" ")
+    return position + 1 if position > 0 else None
+
+
+def encode_cursor(doc_id, offset, max_chars):
+    """
+    Returns:
+        str: an opaque cursor pointing at `offset` in a stored document
+    """
+    payload = json.dumps({"d": doc_id, "o": offset, "n": max_chars}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Args:
+        cursor (str): a cursor made by encode_cursor
+
+    Returns:
+        tuple: (doc_id, offset, max_chars)
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        doc_id, offset, max_chars = payload["d"], int(payload["o"]), int(payload["n"])
+    except (binascii.Error, ValueError, TypeError, KeyError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+    if not isinstance(doc_id, str) or offset < 0 or max_chars <= 0:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return doc_id, offset, max_chars
@@ -0,0 +1,195 @@
+import os
+
+
+def _env_int(name, default):
+    """
+    Read an integer setting from the environment.
+
+    Args:
+        name (str): Name of the environment variable
+        default (int): Value used when the variable is unset or empty
+
+    Returns:
+        int: the configured value
+    """
+    value = os.environ.get(name, "").strip()
+    if not value:
+        return default
+    return int(value)
+
+
+def _env_bool(name, default):
+    """
+    Read a boolean setting from the environment.
+
+    Args:
+        name (str): Name of the environment variable
+        default (bool): Value used when the variable is unset or empty
+
+    Returns:
+        bool: True for values like "1", "true", "yes" or "on"
+    """
+    value = os.environ.get(name, "").strip().lower()
+    if not value:
+        return default
+    return value in ("1", "true", "yes", "on")
+
+
+def _default_cache_dir():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "webscraper")
+
+
+# Number of headless browsers kept alive by the crawler pool.
+BROWSER_POOL_SIZE = _env_int("WEBSCRAPER_BROWSERS", 1)
+
+# Number of pages (tabs) each pooled browser may render at the same time.
+PAGES_PER_BROWSER = _env_int("WEBSCRAPER_PAGES_PER_BROWSER", 4)
+
+# Launch the crawler pool in the background as soon as the server starts.
+PREWARM_BROWSERS = _env_bool("WEBSCRAPER_PREWARM_BROWSERS", True)
+
+# Start the PDF worker processes, which load the marker models, at startup
+# instead of on the first get_pdf call.
+PRELOAD_PDF_MODELS = _env_bool("WEBSCRAPER_PRELOAD_PDF_MODELS", False)
+
+# Read timeout, in seconds, for plain HTTP requests such as PDF downloads.
+HTTP_TIMEOUT = _env_int("WEBSCRAPER_HTTP_TIMEOUT", 60)
+
+# Maximum number of pooled HTTP connections kept by the shared client.
+HTTP_MAX_CONNECTIONS = _env_int("WEBSCRAPER_HTTP_MAX_CONNECTIONS", 20)
+
+# PDFs up to this many bytes are staged in memory; larger ones spill to tmpfs.
+PDF_MEMORY_LIMIT = _env_int("WEBSCRAPER_PDF_MEMORY_LIMIT", 32 * 1024 * 1024)
+
+# Worker threads available for blocking youtube transcript fetches.
+YOUTUBE_WORKERS = _env_int("WEBSCRAPER_YOUTUBE_WORKERS", 4)
+
+# Directory for results that persist across restarts. Set it to an empty
+# value to keep the cache in memory only.
+CACHE_DIR = os.environ.get("WEBSCRAPER_CACHE_DIR", _default_cache_dir())
+
+# Size in bytes of the in-memory result cache.
+CACHE_MEMORY_LIMIT = _env_int("WEBSCRAPER_CACHE_MEMORY_LIMIT", 64 * 1024 * 1024)
+
+# How long, in seconds, results of each tool are served from the cache.
+CACHE_TTLS = {
+    "web": _env_int("WEBSCRAPER_CACHE_TTL_WEB", 60 * 60),
+    "youtube": _env_int("WEBSCRAPER_CACHE_TTL_YOUTUBE", 7 * 24 * 60 * 60),
+    "pdf": _env_int("WEBSCRAPER_CACHE_TTL_PDF", 7 * 24 * 60 * 60),
+}
+
+# Maximum size in bytes of the content addressed store of converted PDFs.
+PDF_STORE_LIMIT = _env_int("WEBSCRAPER_PDF_STORE_LIMIT", 1024 * 1024 * 1024)
+
+# Upper bound on the pages get_webpages_batch loads at the same time.
+BATCH_MAX_CONCURRENCY = _env_int("WEBSCRAPER_BATCH_MAX_CONCURRENCY", 16)
+
+# Try a plain HTTP GET before rendering pages in the browser.
+STATIC_FAST_PATH = _env_bool("WEBSCRAPER_STATIC_FAST_PATH", True)
+
+# Pages with less visible text than this, in characters, are rendered in the
+# browser since their content is probably produced by JavaScript.
+STATIC_MIN_TEXT = _env_int("WEBSCRAPER_STATIC_MIN_TEXT", 500)
+
+# Largest HTML or text body read by the plain GET; bigger pages are rendered
+# in the browser instead.
+STATIC_MAX_BYTES = _env_int("WEBSCRAPER_STATIC_MAX_BYTES", 5 * 1024 * 1024)
+
+# Take pages with a clean embedded text layer as is and only run marker on
+# scanned or garbled pages.
+PDF_TEXT_LAYER = _env_bool("WEBSCRAPER_PDF_TEXT_LAYER", True)
+
+# Minimum text_quality score, between 0 and 1, for a page's text layer to
+# be used instead of marker.
+PDF_TEXT_MIN_QUALITY = float(os.environ.get("WEBSCRAPER_PDF_TEXT_MIN_QUALITY", "") or 0.9)
+
+# Number of marker worker processes; 0 picks one per core, limited by
+# available memory.
+PDF_WORKERS = _env_int("WEBSCRAPER_PDF_WORKERS", 0)
+
+# Memory, in bytes, to budget for each worker's copy of the marker models.
+PDF_WORKER_MEMORY = _env_int("WEBSCRAPER_PDF_WORKER_MEMORY", 4 * 1024 * 1024 * 1024)
+
+# PDFs with at least this many pages for marker are split across the worker
+# processes. 0 disables parallel conversion.
+PDF_PARALLEL_MIN_PAGES = _env_int("WEBSCRAPER_PDF_PARALLEL_MIN_PAGES", 16)
+
+# Smallest number of pages sent to a worker at once.
+PDF_SHARD_PAGES = _env_int("WEBSCRAPER_PDF_SHARD_PAGES", 8)
+
+# Number of background jobs run at the same time.
+JOB_WORKERS = _env_int("WEBSCRAPER_JOB_WORKERS", 2)
+
+# Seconds a finished job and its result are kept.
+JOB_TTL = _env_int("WEBSCRAPER_JOB_TTL", 24 * 60 * 60)
+
+# Concurrency of the scheduler lanes: plain HTTP fetches, browser renders
+# and marker conversions.
+LANE_HTTP_CONCURRENCY = _env_int("WEBSCRAPER_LANE_HTTP", 16)
+LANE_BROWSER_CONCURRENCY = _env_int("WEBSCRAPER_LANE_BROWSER", BROWSER_POOL_SIZE * PAGES_PER_BROWSER)
+LANE_MODEL_CONCURRENCY = _env_int("WEBSCRAPER_LANE_MODEL", 1)
+
+# Requests allowed to wait in each lane before new ones are rejected with a
+# retry hint.
+LANE_QUEUE_LIMIT = _env_int("WEBSCRAPER_LANE_QUEUE_LIMIT", 32)
+
+# Background work (jobs, refreshes) allowed to wait in each lane. It is never
+# rejected and doesn't count against LANE_QUEUE_LIMIT; past this limit it
+# waits for room before joining the queue.
+LANE_BACKGROUND_QUEUE_LIMIT = _env_int("WEBSCRAPER_LANE_BACKGROUND_QUEUE_LIMIT", 32)
+
+# Requests per second, and burst size, allowed to a single host.
+HOST_RATE = float(os.environ.get("WEBSCRAPER_HOST_RATE", "") or 2.0)
+HOST_BURST = _env_int("WEBSCRAPER_HOST_BURST", 4)
+
+# Concurrent requests allowed to a single host.
+HOST_MAX_CONNECTIONS = _env_int("WEBSCRAPER_HOST_MAX_CONNECTIONS", 4)
+
+# Longest Retry-After, in seconds, that is honoured.
+MAX_RETRY_AFTER = _env_int("WEBSCRAPER_MAX_RETRY_AFTER", 300)
+
+# Slow down to the Crawl-delay a host asks for in its robots.txt.
+RESPECT_ROBOTS = _env_bool("WEBSCRAPER_RESPECT_ROBOTS", False)
+
+# User agent token looked up in robots.txt before falling back to "*".
+USER_AGENT_TOKEN = os.environ.get("WEBSCRAPER_USER_AGENT_TOKEN", "webscraper")
+
+# Tries per request for timeouts, connection errors and retryable statuses,
+# and the bounds, in seconds, of the jittered delay between them.
+RETRY_ATTEMPTS = _env_int("WEBSCRAPER_RETRY_ATTEMPTS", 3)
+RETRY_BASE_DELAY = float(os.environ.get("WEBSCRAPER_RETRY_BASE_DELAY", "") or 0.5)
+RETRY_MAX_DELAY = float(os.environ.get("WEBSCRAPER_RETRY_MAX_DELAY", "") or 10.0)
+
+# Consecutive failures after which a host is skipped, and for how many
+# seconds.
+BREAKER_THRESHOLD = _env_int("WEBSCRAPER_BREAKER_THRESHOLD", 5)
+BREAKER_RESET = _env_int("WEBSCRAPER_BREAKER_RESET", 60)
+
+# Seconds a failed call is remembered so repeating it fails immediately.
+FAILURE_CACHE_TTL = _env_int("WEBSCRAPER_FAILURE_CACHE_TTL", 30)
+
+# Answer with an expired cache entry straight away, flagged as stale, and
+# refresh it in the background.
+STALE_WHILE_REVALIDATE = _env_bool("WEBSCRAPER_STALE_WHILE_REVALIDATE", False)
+
+# Seconds past its time to live that an entry may still be served stale.
+MAX_STALE = _env_int("WEBSCRAPER_MAX_STALE", 7 * 24 * 60 * 60)
+
+# Background refreshes run at the same time, and the minimum number of
+# seconds between refreshes of the same entry.
+REFRESH_CONCURRENCY = _env_int("WEBSCRAPER_REFRESH_CONCURRENCY", 2)
+REFRESH_MIN_INTERVAL = _env_int("WEBSCRAPER_REFRESH_MIN_INTERVAL", 60)
+
+# Extra seconds expired results with an ETag or Last-Modified are kept on
+# disk, since revalidating them is much cheaper than fetching them again.
+VALIDATED_RETENTION = _env_int("WEBSCRAPER_VALIDATED_RETENTION", 30 * 24 * 60 * 60)
+
+# Answer only from the cache and never touch the network. Also enabled with
+# the --offline command line flag.
+OFFLINE = _env_bool("WEBSCRAPER_OFFLINE", False)
+
+# Full outputs read in chunks through get_next_chunk: size in bytes of the
+# in-memory tier and of the on-disk store under WEBSCRAPER_CACHE_DIR.
+DOCUMENT_MEMORY_LIMIT = _env_int("WEBSCRAPER_DOCUMENT_MEMORY_LIMIT", 64 * 1024 * 1024)
+DOCUMENT_STORE_LIMIT = _env_int("WEBSCRAPER_DOCUMENT_STORE_LIMIT", 256 * 1024 * 1024)
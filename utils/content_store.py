@@ -0,0 +1,215 @@
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+
+from utils import metrics
+
+# Eviction trims the store to this fraction of its limit, so a full store
+# isn't walked again on every put
+LOW_WATER = 0.8
+
+
+class ContentStore:
+    """
+    Content addressed store of markdown on disk.
+
+    Each document is stored under a hex digest of what it was made from: the
+    SHA-256 of the PDF bytes for converted PDFs, so the same document
+    downloaded from a mirror or with a different query string skips
+    conversion, or of the text itself for documents read in chunks. The
+    least recently used documents are evicted once the store grows past
+    `max_bytes`. Methods do blocking file I/O; async callers run them in a
+    thread.
+    """
+
+    def __init__(self, directory, max_bytes, metric="content_store"):
+        """
+        Args:
+            directory (str): Root directory of the store
+            max_bytes (int): Maximum total size of stored markdown
+            metric (str): Prefix of the hit / miss counters
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.metric = metric
+        self._lock = threading.Lock()
+        # Walking the store is slow for large stores, so the total size is
+        # only computed by the first put
+        self._total = None
+
+    def _path(self, digest):
+        return os.path.join(self.directory, digest[:2], f"{digest}.md")
+
+    def exists(self, digest):
+        """
+        Args:
+            digest (str): key of the document
+
+        Returns:
+            bool: whether the document is stored, without reading it
+        """
+        return os.path.exists(self._path(digest))
+
+    def get(self, digest):
+        """
+        Args:
+            digest (str): key of the document
+
+        Returns:
+            str: the markdown, or None if it isn't stored
+        """
+        path = self._path(digest)
+        try:
+            with open(path, encoding="utf-8") as f:
+                markdown = f.read()
+        except FileNotFoundError:
+            metrics.incr(f"{self.metric}.miss")
+            return None
+        except OSError as e:
+            print(f"Error reading {path}: {e}", file=sys.stderr)
+            metrics.incr(f"{self.metric}.miss")
+            return None
+        # Bump the modification time so eviction keeps recently used documents
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        metrics.incr(f"{self.metric}.hit")
+        return markdown
+
+    def put(self, digest, markdown):
+        """
+        Store a document and evict old entries if needed.
+
+        The store is only a cache, so a failed write is logged and ignored.
+
+        Args:
+            digest (str): key of the document
+            markdown (str): the document
+        """
+        path = self._path(digest)
+        data = markdown.encode("utf-8")
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        except OSError as e:
+            print(f"Could not write to {self.directory}: {e}", file=sys.stderr)
+            return
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            with self._lock:
+                if self._total is None:
+                    self._total = sum(size for _, size, _ in self._entries())
+                try:
+                    self._total -= os.path.getsize(path)
+                except FileNotFoundError:
+                    pass
+                os.replace(tmp_path, path)
+                self._total += len(data)
+                if self._total > self.max_bytes:
+                    self._evict()
+        except BaseException as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            if not isinstance(e, OSError):
+                raise
+            print(f"Could not write to {self.directory}: {e}", file=sys.stderr)
+
+    def link(self, name, digest):
+        """
+        Remember which stored document a name, such as a URL cache key, led
+        to, so it can be found again without fetching what it was made from.
+
+        Args:
+            name (str): any name, e.g. a cache key
+            digest (str): key the document was stored under
+        """
+        path = self._alias_path(name)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with self._lock:
+                try:
+                    previous = os.path.getsize(path)
+                except FileNotFoundError:
+                    previous = 0
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(digest)
+                if self._total is not None:
+                    self._total += len(digest) - previous
+        except OSError as e:
+            print(f"Could not write to {self.directory}: {e}", file=sys.stderr)
+
+    def get_linked(self, name):
+        """
+        Args:
+            name (str): a name passed to link
+
+        Returns:
+            str: the converted markdown, or None if unknown or evicted
+        """
+        path = self._alias_path(name)
+        try:
+            with open(path, encoding="utf-8") as f:
+                digest = f.read().strip()
+        except OSError:
+            return None
+        markdown = self.get(digest)
+        if markdown is None:
+            # The document was evicted, drop the dangling alias
+            self._remove(path)
+        return markdown
+
+    def _alias_path(self, name):
+        return os.path.join(
+            self.directory, "aliases", hashlib.sha256(name.encode("utf-8")).hexdigest()
+        )
+
+    def _entries(self):
+        aliases = os.path.join(self.directory, "aliases")
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".md") and root != aliases:
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def _evict(self):
+        # Documents and aliases go by last use; aliases left pointing at an
+        # evicted document are dropped as well
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        target = self.max_bytes * LOW_WATER
+        aliases = []
+        for path, size, _ in entries:
+            if not path.endswith(".md"):
+                aliases.append((path, size))
+            if self._total <= target:
+                continue
+            if self._remove(path, size):
+                metrics.incr(f"{self.metric}.evicted")
+        for path, size in aliases:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    digest = f.read().strip()
+            except OSError:
+                continue
+            if not os.path.exists(self._path(digest)):
+                self._remove(path, size)
+        print(f"Store {self.metric} trimmed to {self._total} bytes", file=sys.stderr)
+
+    def _remove(self, path, size=None):
+        try:
+            if size is None:
+                size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        if self._total is not None:
+            self._total -= size
+        return True
@@ -0,0 +1,86 @@
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+
+from utils import metrics
+
+
+class DocumentStore:
+    """
+    Full tool outputs that are being read a chunk at a time.
+
+    Documents are keyed by the SHA-256 of their text and kept in an in-memory
+    LRU bounded by total size in bytes. When a content addressed store is
+    given, documents are also written there so cursors keep working after
+    they leave memory or the server restarts.
+    """
+
+    def __init__(self, memory_limit, store=None):
+        """
+        Args:
+            memory_limit (int): Maximum size in bytes of the in-memory tier
+            store (ContentStore): Optional on-disk store for documents evicted from memory
+        """
+        self.memory_limit = memory_limit
+        self.store = store
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._lock = threading.Lock()
+
+    async def put(self, text):
+        """
+        Args:
+            text (str): the whole document
+
+        Returns:
+            str: id to read the document back with
+        """
+        data = text.encode("utf-8")
+        doc_id = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            known = doc_id in self._memory
+            self._remember(doc_id, text, len(data))
+        if not known and self.store is not None:
+            await asyncio.to_thread(self._persist, doc_id, text)
+        return doc_id
+
+    async def get(self, doc_id):
+        """
+        Args:
+            doc_id (str): an id returned by put
+
+        Returns:
+            str: the document, or None if it is no longer stored
+        """
+        with self._lock:
+            text = self._memory.get(doc_id)
+            if text is not None:
+                self._memory.move_to_end(doc_id)
+                metrics.incr("documents.hit")
+                return text
+        if self.store is None:
+            metrics.incr("documents.miss")
+            return None
+        text = await asyncio.to_thread(self.store.get, doc_id)
+        if text is None:
+            return None
+        with self._lock:
+            self._remember(doc_id, text, len(text.encode("utf-8")))
+        return text
+
+    def _persist(self, doc_id, text):
+        if not self.store.exists(doc_id):
+            self.store.put(doc_id, text)
+
+    def _remember(self, doc_id, text, size):
+        if doc_id in self._memory:
+            self._memory.move_to_end(doc_id)
+            return
+        if size > self.memory_limit:
+            return
+        self._memory[doc_id] = text
+        self._memory_size += size
+        while self._memory_size > self.memory_limit:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted.encode("utf-8"))
@@ -0,0 +1,46 @@
+import importlib.util
+
+from utils import config
+from utils.offline import ensure_online
+
+_client = None
+
+
+def get_client():
+    """
+    Return the shared httpx.AsyncClient, creating it on first use.
+
+    The client keeps connections alive between calls and negotiates HTTP/2
+    when the optional `h2` package is installed.
+
+    Raises OfflineMiss while offline, so nothing reaches the network.
+
+    Returns:
+        httpx.AsyncClient: the pooled client
+    """
+    ensure_online("The requested page")
+    global _client
+    if _client is None or _client.is_closed:
+        import httpx
+
+        _client = httpx.AsyncClient(
+            http2=importlib.util.find_spec("h2") is not None,
+            follow_redirects=True,
+            timeout=httpx.Timeout(config.HTTP_TIMEOUT, connect=10.0),
+            limits=httpx.Limits(
+                max_connections=config.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=config.HTTP_MAX_CONNECTIONS,
+                keepalive_expiry=30.0,
+            ),
+        )
+    return _client
+
+
+async def close_client():
+    """
+    Close the shared client, if one was created.
+    """
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,263 @@
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+
+from utils import metrics
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Longest wait between sweeps for expired jobs
+EXPIRE_INTERVAL = 600
+
+
+class JobQueue:
+    """
+    Background jobs for work that outlasts a single tool call.
+
+    Jobs run on a fixed number of worker tasks. Their state and results are
+    written to `directory`, so finished results survive a restart and jobs
+    that were queued or running when the server stopped are run again. Jobs
+    are forgotten `ttl` seconds after they finish.
+    """
+
+    def __init__(self, directory, ttl, workers=2):
+        """
+        Args:
+            directory (str): Directory for job state, or None to keep jobs in memory only
+            ttl (int): Seconds a finished job and its result are kept
+            workers (int): Number of jobs run at the same time
+        """
+        self.directory = directory
+        self.ttl = ttl
+        self.workers = max(1, workers)
+        self._runners = {}
+        self._jobs = {}
+        self._results = {}
+        self._queue = None
+        self._tasks = []
+
+    def register(self, kind, runner):
+        """
+        Register the coroutine function that runs jobs of a kind.
+
+        Args:
+            kind (str): job kind, e.g. "pdf"
+            runner: coroutine function taking the job params as keyword arguments and returning text
+        """
+        self._runners[kind] = runner
+
+    @property
+    def kinds(self):
+        return sorted(self._runners)
+
+    async def start(self, resume=True):
+        """
+        Load persisted jobs, re-queue unfinished ones and start the workers.
+
+        Args:
+            resume (bool): run the unfinished jobs again; when False they are
+                left untouched on disk for the next start
+        """
+        if self.directory:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+            except OSError as e:
+                print(f"Jobs will not survive a restart: {e}", file=sys.stderr)
+                self.directory = None
+        self._queue = asyncio.Queue()
+        for job in self._load_jobs():
+            self._jobs[job["id"]] = job
+            if job["status"] in (QUEUED, RUNNING):
+                job["status"] = QUEUED
+                if resume:
+                    self._queue.put_nowait(job["id"])
+        self.expire()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._expire_periodically()))
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, kind, params):
+        """
+        Queue a job.
+
+        Args:
+            kind (str): a registered job kind
+            params (dict): keyword arguments for the runner
+
+        Returns:
+            dict: the new job's status
+        """
+        if kind not in self._runners:
+            raise ValueError(f"Unknown job kind {kind!r}, expected one of {', '.join(self.kinds)}")
+        if self._queue is None:
+            raise RuntimeError("Job queue is not running")
+        self.expire()
+        job = {
+            "id": uuid.uuid4().hex,
+            "kind": kind,
+            "params": params,
+            "status": QUEUED,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "error": None,
+            "result_chars": None,
+        }
+        self._jobs[job["id"]] = job
+        self._save(job)
+        self._queue.put_nowait(job["id"])
+        metrics.incr(f"jobs.{kind}.submitted")
+        return self.status(job["id"])
+
+    def status(self, job_id):
+        """
+        Args:
+            job_id (str): id returned by submit
+
+        Returns:
+            dict: the job's state, without its params
+        """
+        self.expire()
+        job = self._get(job_id)
+        status = {key: value for key, value in job.items() if key != "params"}
+        if job["status"] == QUEUED:
+            status["position"] = [
+                other for other in self._jobs.values() if other["status"] == QUEUED
+            ].index(job) + 1
+        return status
+
+    def result(self, job_id, offset=0, limit=None):
+        """
+        Read part of a finished job's result, so large results can be fetched
+        in pieces and a fetch can be resumed.
+
+        Args:
+            job_id (str): id returned by submit
+            offset (int): character offset to start from
+            limit (int): Optional maximum number of characters to return
+
+        Returns:
+            tuple: (text, next_offset) where next_offset is None at the end of the result
+        """
+        if offset < 0:
+            raise ValueError(f"offset must not be negative, got {offset}")
+        if limit is not None and limit <= 0:
+            raise ValueError(f"max_chars must be positive, got {limit}")
+        self.expire()
+        job = self._get(job_id)
+        if job["status"] == FAILED:
+            raise ValueError(f"Job {job_id} failed: {job['error']}")
+        if job["status"] != DONE:
+            raise ValueError(f"Job {job_id} is {job['status']}, its result is not ready yet")
+        text = self._read_result(job_id)
+        end = len(text) if limit is None else min(len(text), offset + limit)
+        return text[offset:end], (end if end < len(text) else None)
+
+    def expire(self):
+        """
+        Forget finished jobs older than the time to live.
+        """
+        cutoff = time.time() - self.ttl
+        for job_id, job in list(self._jobs.items()):
+            if job["finished_at"] is not None and job["finished_at"] < cutoff:
+                del self._jobs[job_id]
+                self._results.pop(job_id, None)
+                for path in (self._state_path(job_id), self._result_path(job_id)):
+                    if path and os.path.exists(path):
+                        os.remove(path)
+
+    async def _expire_periodically(self):
+        while True:
+            await asyncio.sleep(min(self.ttl, EXPIRE_INTERVAL))
+            self.expire()
+
+    def _get(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is None:
+            raise ValueError(f"Unknown or expired job: {job_id}")
+        return job
+
+    async def _work(self):
+        while True:
+            job_id = await self._queue.get()
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] != QUEUED:
+                continue
+            job["status"] = RUNNING
+            job["started_at"] = time.time()
+            self._save(job)
+            try:
+                text = await self._runners[job["kind"]](**job["params"])
+            except asyncio.CancelledError:
+                # Left as running on disk so it is picked up again on restart
+                raise
+            except Exception as e:
+                print(f"Job {job_id} failed: {e}", file=sys.stderr)
+                job["status"] = FAILED
+                job["error"] = str(e)
+                metrics.incr(f"jobs.{job['kind']}.failed")
+            else:
+                self._write_result(job_id, text)
+                job["status"] = DONE
+                job["result_chars"] = len(text)
+                metrics.incr(f"jobs.{job['kind']}.done")
+            job["finished_at"] = time.time()
+            self._save(job)
+
+    def _state_path(self, job_id):
+        return os.path.join(self.directory, f"{job_id}.json") if self.directory else None
+
+    def _result_path(self, job_id):
+        return os.path.join(self.directory, f"{job_id}.result.md") if self.directory else None
+
+    def _save(self, job):
+        path = self._state_path(job["id"])
+        if path is None:
+            return
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(job, f)
+        os.replace(tmp_path, path)
+
+    def _write_result(self, job_id, text):
+        path = self._result_path(job_id)
+        if path is None:
+            self._results[job_id] = text
+            return
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def _read_result(self, job_id):
+        path = self._result_path(job_id)
+        if path is None:
+            return self._results[job_id]
+        try:
+            with open(path, encoding="utf-8") as f:
+                return f.read()
+        except OSError as e:
+            raise ValueError(f"The result of job {job_id} is no longer available") from e
+
+    def _load_jobs(self):
+        if not self.directory:
+            return []
+        jobs = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), encoding="utf-8") as f:
+                    jobs.append(json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"Skipping unreadable job file {name}: {e}", file=sys.stderr)
+        return sorted(jobs, key=lambda job: job["created_at"])
@@ -0,0 +1,26 @@
+import threading
+from collections import Counter
+
+_lock = threading.Lock()
+_counters = Counter()
+
+
+def incr(name, amount=1):
+    """
+    Increment a named counter.
+
+    Args:
+        name (str): dotted counter name, e.g. "cache.web.hit"
+        amount (int): value to add
+    """
+    with _lock:
+        _counters[name] += amount
+
+
+def snapshot():
+    """
+    Returns:
+        dict: a copy of every counter, sorted by name
+    """
+    with _lock:
+        return dict(sorted(_counters.items()))
@@ -0,0 +1,50 @@
+import contextvars
+from contextlib import contextmanager
+
+from utils import config
+
+_offline = contextvars.ContextVar("offline", default=False)
+
+
+class OfflineMiss(Exception):
+    """
+    Raised when something would have to go to the network while the server
+    or the current call is offline.
+    """
+
+
+def is_offline():
+    """
+    Returns:
+        bool: True when the server runs with --offline or the current call asked to be answered from the cache
+    """
+    return config.OFFLINE or _offline.get()
+
+
+@contextmanager
+def offline_mode(enabled=True):
+    """
+    Answer the block, and everything it awaits, from the cache only.
+
+    Args:
+        enabled (bool): leave the mode unchanged when False
+    """
+    if not enabled:
+        yield
+        return
+    token = _offline.set(True)
+    try:
+        yield
+    finally:
+        _offline.reset(token)
+
+
+def ensure_online(what):
+    """
+    Fail immediately instead of touching the network while offline.
+
+    Args:
+        what (str): what was about to be fetched, for the error message
+    """
+    if is_offline():
+        raise OfflineMiss(f"{what} is not in the cache and the server is in offline mode")
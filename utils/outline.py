@@ -0,0 +1,166 @@
+import asyncio
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+_HEADING_RE = re.compile(r"^(#{1,6})[ \t]+(.+?)(?:[ \t]+#+)?[ \t]*$")
+_FENCE_RE = re.compile(r"^\s*(```|~~~)")
+# Page comments put in converted PDFs, see pdf_convert.PAGE_MARKER
+_PAGE_RE = re.compile(r"^<!-- page (\d+) -->\s*$")
+
+# Id of the text before the first heading
+PREAMBLE = "0"
+
+
+@dataclass
+class Section:
+    id: str
+    level: int
+    title: str
+    start: int
+    end: int
+
+    @property
+    def size(self):
+        return self.end - self.start
+
+
+def parse_outline(text):
+    """
+    Index the markdown headings of a document.
+
+    Sections are numbered like "1", "1.2", "1.2.1" after their place in the
+    heading tree, and span from their heading to the next heading of the
+    same or a higher level, so a section includes its subsections. Headings
+    inside fenced code blocks are ignored. PDFs taken from their text layer
+    have no headings, so their pages become sections "p1", "p2", ...
+
+    Args:
+        text (str): markdown from any of the tools
+
+    Returns:
+        list[Section]: the sections in document order
+    """
+    headings = []
+    pages = []
+    offset = 0
+    in_fence = False
+    for line in text.splitlines(keepends=True):
+        if _FENCE_RE.match(line):
+            in_fence = not in_fence
+        elif not in_fence:
+            match = _HEADING_RE.match(line.rstrip("\r\n"))
+            if match:
+                headings.append((offset, len(match.group(1)), match.group(2).strip()))
+            match = _PAGE_RE.match(line)
+            if match:
+                pages.append((offset, match.group(1)))
+        offset += len(line)
+
+    sections = []
+    first = (headings or pages)[0][0] if headings or pages else len(text)
+    if text[:first].strip():
+        sections.append(Section(PREAMBLE, 0, "(text before the first heading)", 0, first))
+    if not headings:
+        for i, (start, number) in enumerate(pages):
+            end = pages[i + 1][0] if i + 1 < len(pages) else len(text)
+            sections.append(Section(f"p{number}", 1, f"Page {number}", start, end))
+        return sections
+
+    # (level, id, child count, section) of the headings enclosing the current
+    # one; a section ends where the heading that pops it off the stack starts
+    stack = []
+    top_count = 0
+    for start, level, title in headings:
+        while stack and stack[-1][0] >= level:
+            stack.pop()[3].end = start
+        if stack:
+            parent_level, parent_id, children, parent = stack[-1]
+            stack[-1] = (parent_level, parent_id, children + 1, parent)
+            section_id = f"{parent_id}.{children + 1}"
+        else:
+            top_count += 1
+            section_id = str(top_count)
+        section = Section(section_id, level, title, start, len(text))
+        stack.append((level, section_id, 0, section))
+        sections.append(section)
+    return sections
+
+
+def format_outline(sections, depth=None):
+    """
+    Args:
+        sections (list[Section]): sections from parse_outline
+        depth (int): Optional number of heading levels to show
+
+    Returns:
+        str: one indented line per section with its id, title and size
+    """
+    lines = []
+    for section in sections:
+        nesting = section.id.count(".")
+        if depth is not None and nesting >= depth:
+            continue
+        lines.append(f"{'  ' * nesting}[{section.id}] {section.title} ({section.size} chars)")
+    return "\n".join(lines)
+
+
+def select_sections(text, sections, ids):
+    """
+    Cut the chosen sections out of a document.
+
+    Args:
+        text (str): the document
+        sections (list[Section]): sections from parse_outline
+        ids (list[str]): section ids; a section already included by a chosen
+            parent is not repeated
+
+    Returns:
+        str: the sections in the order given, separated by blank lines
+    """
+    by_id = {section.id: section for section in sections}
+    unknown = [section_id for section_id in ids if section_id not in by_id]
+    if unknown:
+        raise ValueError(f"Unknown section ids: {', '.join(unknown)}")
+    chosen = list(dict.fromkeys(ids))
+    parts = []
+    for section_id in chosen:
+        if any(section_id.startswith(f"{other}.") for other in chosen if other != PREAMBLE):
+            continue
+        section = by_id[section_id]
+        parts.append(text[section.start:section.end].strip("\n"))
+    return "\n\n".join(parts)
+
+
+class OutlineIndex:
+    """
+    Parsed outlines of recently used documents, keyed by document id.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._outlines = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def get(self, doc_id, text):
+        """
+        Args:
+            doc_id (str): id of the document, e.g. the SHA-256 of its text
+            text (str): the document, parsed off the event loop if its
+                outline isn't known yet
+
+        Returns:
+            list[Section]: the outline
+        """
+        with self._lock:
+            sections = self._outlines.get(doc_id)
+            if sections is not None:
+                self._outlines.move_to_end(doc_id)
+                return sections
+        sections = await asyncio.to_thread(parse_outline, text)
+        with self._lock:
+            self._outlines[doc_id] = sections
+            while len(self._outlines) > self.max_entries:
+                self._outlines.popitem(last=False)
+        return sections
@@ -0,0 +1,222 @@
+import asyncio
+import re
+import sys
+
+from utils import config, metrics
+from utils.pdf_models import get_converter
+from utils.pdf_workers import run_marker_in_workers
+from utils.scheduler import scheduler
+from utils.pdf_text import count_pages, extract_text_layer, text_quality, text_to_markdown
+
+# Separator marker puts before every page when paginate_output is set
+_PAGE_SEPARATOR_RE = re.compile(r"\n*\{(\d+)\}-{48}\n*")
+
+# Comment put before every page of documents converted page by page, so the
+# outline can fall back to pages when the text layer has no headings
+PAGE_MARKER = "<!-- page {} -->"
+
+
+def parse_page_ranges(spec):
+    """
+    Parse a page selection like "1-5,12" into zero based page ranges.
+
+    Ranges are kept as pairs rather than expanded, since the selection comes
+    from the caller before the page count is known. A range with no end,
+    like "12-", runs to the last page and has None as its last page.
+
+    Args:
+        spec (str): comma separated one based pages or inclusive ranges
+
+    Returns:
+        list[tuple]: sorted, merged (first, last) zero based inclusive ranges
+    """
+    ranges = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        start, dash, end = part.partition("-")
+        try:
+            first = int(start)
+            if not dash:
+                last = first
+            elif end.strip():
+                last = int(end)
+            else:
+                last = None
+        except ValueError:
+            raise ValueError(f"Invalid page range: {part!r}") from None
+        if first < 1 or (last is not None and last < first):
+            raise ValueError(f"Invalid page range: {part!r}")
+        ranges.append((first - 1, None if last is None else last - 1))
+    if not ranges:
+        raise ValueError(f"No pages selected by {spec!r}")
+    merged = []
+    for first, last in sorted(ranges, key=lambda r: r[0]):
+        if merged and (merged[-1][1] is None or first <= merged[-1][1] + 1):
+            previous = merged[-1][1]
+            end = None if previous is None or last is None else max(previous, last)
+            merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((first, last))
+    return merged
+
+
+def format_page_ranges(pages):
+    """
+    Format zero based page numbers as one based ranges.
+
+    Args:
+        pages (list[int]): sorted zero based page numbers
+
+    Returns:
+        str: e.g. "1-5,12"
+    """
+    ranges = []
+    for page in pages:
+        if ranges and ranges[-1][1] == page - 1:
+            ranges[-1] = (ranges[-1][0], page)
+        else:
+            ranges.append((page, page))
+    return format_ranges(ranges)
+
+
+def format_ranges(ranges):
+    """
+    Format zero based (first, last) ranges as one based ranges, the inverse
+    of parse_page_ranges.
+
+    Returns:
+        str: e.g. "1-5,12" or "12-"
+    """
+    return ",".join(
+        str(first + 1) if first == last
+        else f"{first + 1}-" if last is None
+        else f"{first + 1}-{last + 1}"
+        for first, last in ranges
+    )
+
+
+def select_pages(total_pages, pages=None, max_pages=None):
+    """
+    Work out which pages of a document to convert.
+
+    Args:
+        total_pages (int): number of pages in the document
+        pages (str): Optional selection like "1-5,12"
+        max_pages (int): Optional cap on the number of pages
+
+    Returns:
+        list[int]: zero based pages to convert
+    """
+    selected = list(range(total_pages))
+    if pages:
+        selected = []
+        for first, last in parse_page_ranges(pages):
+            if last is None or last >= total_pages:
+                last = total_pages - 1
+            selected.extend(range(first, last + 1))
+        if not selected:
+            raise ValueError(f"Pages {pages!r} are outside the document, which has {total_pages} page(s)")
+    if max_pages is not None and max_pages > 0:
+        selected = selected[:max_pages]
+    return selected
+
+
+def run_marker(path, pages=None):
+    """
+    Convert pages of a PDF with marker. Runs inside a PDF worker process.
+
+    Args:
+        path (str): path to the PDF
+        pages (list[int]): zero based pages to convert, or None for all of them
+
+    Returns:
+        dict: markdown per page number, or {None: markdown} when `pages` is None
+    """
+    from marker.output import text_from_rendered
+
+    if pages is None:
+        rendered = get_converter()(path)
+        output, _, _ = text_from_rendered(rendered)
+        return {None: output}
+
+    converter = get_converter({"page_range": pages, "paginate_output": True})
+    output, _, _ = text_from_rendered(converter(path))
+    parts = _PAGE_SEPARATOR_RE.split(output)
+    # parts is [preamble, page, text, page, text, ...]
+    by_page = {int(page): text.strip() for page, text in zip(parts[1::2], parts[2::2])}
+    if not by_page:
+        by_page = {pages[0]: output.strip()}
+    return by_page
+
+
+async def _marker(path, pages=None, total_pages=None):
+    async with scheduler.slot("model"):
+        return await run_marker_in_workers(path, pages, total_pages)
+
+
+async def convert_pdf(staged, pages=None, max_pages=None):
+    """
+    Convert a PDF to markdown, only running marker on the pages that need it.
+
+    Pages with a clean embedded text layer are taken as is. Scanned,
+    image-only or garbled pages go through marker's layout and OCR models in
+    the worker processes, in parallel for large documents. The results are
+    merged back in page order. PDFs still held in memory are read from
+    memory, and only written to the staging directory when marker needs them.
+
+    Args:
+        staged (StagedPdf): the downloaded PDF
+        pages (str): Optional one based selection like "1-5,12"
+        max_pages (int): Optional cap on the number of pages converted
+
+    Returns:
+        tuple: (markdown, converted zero based pages, total page count)
+    """
+    source = staged.getvalue() if staged.in_memory else staged.as_path()
+    total_pages = await asyncio.to_thread(count_pages, source)
+    if total_pages is None:
+        # Let marker report the problem with the file
+        if pages or max_pages:
+            print("Could not count the pages of the PDF, converting all of them", file=sys.stderr)
+        metrics.incr("pdf.documents.marker")
+        return (await _marker(staged.as_path()))[None], None, None
+    selected = select_pages(total_pages, pages, max_pages)
+    marker_pages = None if len(selected) == total_pages else selected
+
+    texts = None
+    if config.PDF_TEXT_LAYER:
+        texts = await asyncio.to_thread(extract_text_layer, source, selected)
+    if not texts:
+        metrics.incr("pdf.documents.marker")
+        return _join(await _marker(staged.as_path(), marker_pages, total_pages), selected), selected, total_pages
+
+    needs_marker = [
+        index for index in selected
+        if text_quality(texts[index]) < config.PDF_TEXT_MIN_QUALITY
+    ]
+    metrics.incr("pdf.pages.text_layer", len(selected) - len(needs_marker))
+    metrics.incr("pdf.pages.marker", len(needs_marker))
+    print(
+        f"PDF triage: {len(selected) - len(needs_marker)} page(s) from text layer, "
+        f"{len(needs_marker)} page(s) to marker",
+        file=sys.stderr,
+    )
+
+    if len(needs_marker) == len(selected):
+        return _join(await _marker(staged.as_path(), marker_pages, total_pages), selected), selected, total_pages
+    converted = await _marker(staged.as_path(), needs_marker, total_pages) if needs_marker else {}
+    for index in selected:
+        if index not in converted:
+            converted[index] = text_to_markdown(texts[index])
+    return _join(converted, selected), selected, total_pages
+
+
+def _join(converted, selected):
+    if None in converted:
+        return converted[None]
+    return "\n\n".join(
+        f"{PAGE_MARKER.format(index + 1)}\n\n{converted[index]}"
+        for index in selected if converted.get(index)
+    )
@@ -0,0 +1,58 @@
+import sys
+import threading
+
+_lock = threading.Lock()
+_artifact_dict = None
+_converter = None
+
+
+def get_artifact_dict():
+    """
+    Return the marker model artifacts, loading them on first use.
+
+    The layout, OCR and recognition models are loaded once per process and
+    shared by every converter built afterwards.
+
+    Returns:
+        dict: marker artifact dict
+    """
+    global _artifact_dict
+    if _artifact_dict is None:
+        with _lock:
+            if _artifact_dict is None:
+                # Imported here so torch is only loaded once a PDF is requested
+                from marker.models import create_model_dict
+
+                print("Loading marker models...", file=sys.stderr)
+                _artifact_dict = create_model_dict()
+                print("Marker models loaded", file=sys.stderr)
+    return _artifact_dict
+
+
+def get_converter(converter_config=None):
+    """
+    Return a PdfConverter backed by the shared model artifacts.
+
+    Without a config the same process wide converter is returned every time.
+    With one, a new converter is built around the already loaded models,
+    which is cheap.
+
+    Args:
+        converter_config (dict): Optional marker config, e.g. {"page_range": [0, 1]}
+
+    Returns:
+        PdfConverter: the converter
+    """
+    global _converter
+    if converter_config:
+        from marker.converters.pdf import PdfConverter
+
+        return PdfConverter(artifact_dict=get_artifact_dict(), config=converter_config)
+    if _converter is None:
+        artifact_dict = get_artifact_dict()
+        with _lock:
+            if _converter is None:
+                from marker.converters.pdf import PdfConverter
+
+                _converter = PdfConverter(artifact_dict=artifact_dict)
+    return _converter
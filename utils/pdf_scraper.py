@@ -1,43 +1,50 @@
-import os
-import requests
-import tempfile
-from urllib.parse import urlparse
+import sys
 
-def download_pdf_from_url(url, output_path=None):
+from utils.pdf_staging import StagedPdf
+
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 1024 * 1024
+
+
+def chunk_size_for(response):
     """
-    Download a PDF file from a URL.
-    
+    Pick a read size for a response based on its advertised length.
+
+    Small files are read in small chunks while large files use bigger reads
+    so a download takes a bounded number of iterations.
+
     Args:
-        url (str): URL of the PDF to download
-        output_path (str): Optional path to save the PDF. If None, saves to a temporary file.
-        
+        response (httpx.Response): the streaming response
+
     Returns:
-        str: Path to the downloaded PDF file
+        int: chunk size in bytes
     """
-    # Parse the URL to get the filename
-    parsed_url = urlparse(url)
-    filename = os.path.basename(parsed_url.path)
-    
-    # If no filename was found or it doesn't end with .pdf, use a default name
-    if not filename or not filename.endswith('.pdf'):
-        filename = 'downloaded_document.pdf'
-    
-    # Determine where to save the file
-    if output_path is None:
-        # Create a temporary file
-        temp_dir = tempfile.gettempdir()
-        output_path = os.path.join(temp_dir, filename)
-    
-    print("Downloading PDF...")
-    # Download the PDF
-    response = requests.get(url, stream=True)
-    response.raise_for_status() 
-    
-    print("Saving PDF...")
-    with open(output_path, 'wb') as f:
-        for chunk in response.iter_content(chunk_size=8192):
-            if chunk:
-                f.write(chunk)
-    
-    print(f"Downloaded PDF to: {output_path}")
-    return output_path
\ No newline at end of file
+    length = response.headers.get("Content-Length", "")
+    if not length.isdigit():
+        return MIN_CHUNK_SIZE
+    return max(MIN_CHUNK_SIZE, min(MAX_CHUNK_SIZE, int(length) // 64))
+
+
+async def stage_chunks(chunks, head=b""):
+    """
+    Write a streamed PDF into a new StagedPdf.
+
+    Args:
+        chunks: async iterator over the remaining bytes of the body
+        head (bytes): bytes already read from the stream
+
+    Returns:
+        StagedPdf: the downloaded PDF
+    """
+    staged = StagedPdf()
+    try:
+        if head:
+            staged.write(head)
+        async for chunk in chunks:
+            staged.write(chunk)
+    except BaseException:
+        staged.close()
+        raise
+    print(f"Downloaded PDF ({staged.size} bytes)", file=sys.stderr)
+    return staged
+
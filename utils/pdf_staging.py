@@ -0,0 +1,130 @@
+import hashlib
+import io
+import os
+import tempfile
+
+from utils import config
+
+SHM_DIR = "/dev/shm"
+
+
+def staging_dir():
+    """
+    Return the directory used for spilled PDFs, preferring a RAM backed tmpfs.
+
+    Returns:
+        str: /dev/shm when it is usable, otherwise the system temp directory
+    """
+    if os.path.isdir(SHM_DIR) and os.access(SHM_DIR, os.W_OK):
+        return SHM_DIR
+    return tempfile.gettempdir()
+
+
+class StagedPdf:
+    """
+    Holds a downloaded PDF for the duration of one conversion.
+
+    Bytes are kept in memory until they exceed `max_memory`, after which they
+    spill to a uniquely named file in the staging directory. Concurrent
+    downloads never share a file, and `close()` (or leaving the `with` block)
+    always removes anything written to disk.
+    """
+
+    def __init__(self, max_memory=None, suffix=".pdf"):
+        """
+        Args:
+            max_memory (int): Bytes to hold in memory before spilling to a file
+            suffix (str): Suffix used for the spilled file name
+        """
+        if max_memory is None:
+            max_memory = config.PDF_MEMORY_LIMIT
+        self.max_memory = max_memory
+        self.suffix = suffix
+        self.size = 0
+        self.path = None
+        self._sha256 = hashlib.sha256()
+        self._buffer = io.BytesIO()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @property
+    def in_memory(self):
+        return self.path is None
+
+    @property
+    def sha256(self):
+        """
+        Hex SHA-256 of the bytes written so far, computed while streaming.
+        """
+        return self._sha256.hexdigest()
+
+    def write(self, chunk):
+        """
+        Append a chunk of the PDF.
+
+        Args:
+            chunk (bytes): downloaded bytes
+        """
+        if self._file is None and self.size + len(chunk) > self.max_memory:
+            self._spill()
+        if self._file is not None:
+            self._file.write(chunk)
+        else:
+            self._buffer.write(chunk)
+        self._sha256.update(chunk)
+        self.size += len(chunk)
+
+    def getvalue(self):
+        """
+        Returns:
+            bytes: the full PDF contents
+        """
+        if self._file is None:
+            return self._buffer.getvalue()
+        self._file.flush()
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def as_path(self):
+        """
+        Return a filesystem path for the PDF, writing it to the staging
+        directory first if it is still held in memory.
+
+        Returns:
+            str: path to the staged PDF
+        """
+        if self._file is None:
+            self._spill()
+        self._file.flush()
+        return self.path
+
+    def close(self):
+        """
+        Release the buffer and delete the staged file, if any.
+        """
+        self._buffer = io.BytesIO()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+
+    def _spill(self):
+        self._file = tempfile.NamedTemporaryFile(
+            prefix="webscraper-",
+            suffix=self.suffix,
+            dir=staging_dir(),
+            delete=False,
+        )
+        self.path = self._file.name
+        self._file.write(self._buffer.getvalue())
+        self._buffer = io.BytesIO()
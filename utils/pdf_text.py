@@ -0,0 +1,103 @@
+import re
+import sys
+import unicodedata
+
+_HYPHEN_BREAK_RE = re.compile(r"(\w)-\n(\w)")
+
+
+def count_pages(source):
+    """
+    Args:
+        source (str | bytes): path to the PDF, or its contents
+
+    Returns:
+        int: number of pages, or None if the PDF can't be read
+    """
+    import pypdfium2
+
+    try:
+        pdf = pypdfium2.PdfDocument(source)
+    except Exception as e:
+        print(f"Could not read PDF: {e}", file=sys.stderr)
+        return None
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+
+def extract_text_layer(source, pages=None):
+    """
+    Extract the embedded text of pages of a PDF.
+
+    Args:
+        source (str | bytes): path to the PDF, or its contents
+        pages (list[int]): zero based pages to read, or None for all of them
+
+    Returns:
+        dict: text of each page by page number, or None if the PDF can't be read
+    """
+    import pypdfium2
+
+    try:
+        pdf = pypdfium2.PdfDocument(source)
+    except Exception as e:
+        print(f"Could not read PDF text layer: {e}", file=sys.stderr)
+        return None
+    try:
+        if pages is None:
+            pages = range(len(pdf))
+        texts = {}
+        for index in pages:
+            page = pdf[index]
+            textpage = page.get_textpage()
+            texts[index] = textpage.get_text_range()
+            textpage.close()
+            page.close()
+        return texts
+    finally:
+        pdf.close()
+
+
+def text_quality(text):
+    """
+    Score how usable a page's embedded text is.
+
+    Scanned pages have little or no text, and broken font encodings produce
+    replacement characters, control characters or letter-spaced runs.
+
+    Args:
+        text (str): text extracted from one page
+
+    Returns:
+        float: 0.0 for unusable text up to 1.0 for clean text
+    """
+    stripped = text.strip()
+    if len(stripped) < 20:
+        return 0.0
+    chars = [c for c in stripped if not c.isspace()]
+    bad = sum(
+        1 for c in chars
+        if c == "�" or unicodedata.category(c) in ("Cc", "Co", "Cn")
+    )
+    clean_ratio = 1.0 - bad / len(chars)
+    words = stripped.split()
+    single = sum(1 for word in words if len(word) == 1)
+    word_ratio = 1.0 - max(0.0, single / len(words) - 0.3)
+    return max(0.0, min(clean_ratio, word_ratio))
+
+
+def text_to_markdown(text):
+    """
+    Turn the text layer of a page into markdown paragraphs.
+
+    Args:
+        text (str): text extracted from one page
+
+    Returns:
+        str: the page as markdown
+    """
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    text = _HYPHEN_BREAK_RE.sub(r"\1\2", text)
+    lines = [line.strip() for line in text.split("\n")]
+    return "\n".join(lines).strip()
@@ -0,0 +1,245 @@
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from utils import config, metrics
+from utils.pdf_staging import staging_dir
+
+_pool = None
+# Size the pool was started with; available memory drops once the workers
+# have loaded their models, so it is not recomputed afterwards
+_pool_workers = None
+# Barrier the prewarm pings wait on, so each lands on a different worker;
+# set in the workers by _init_worker
+_started = None
+# Seconds a prewarm ping waits for the other workers to start
+PREWARM_TIMEOUT = 600
+
+
+def available_memory():
+    """
+    Memory available for new processes, MemAvailable in /proc/meminfo, which
+    unlike free memory counts page cache the kernel can reclaim.
+
+    Returns:
+        int: bytes of physical memory currently available, or None if unknown
+    """
+    try:
+        with open("/proc/meminfo", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def worker_count():
+    """
+    Number of marker worker processes to run.
+
+    WEBSCRAPER_PDF_WORKERS wins when set. Otherwise one worker per core, capped
+    by how many copies of the models fit in the available memory.
+
+    Returns:
+        int: the number of workers, at least 1
+    """
+    if config.PDF_WORKERS > 0:
+        return config.PDF_WORKERS
+    workers = os.cpu_count() or 1
+    memory = available_memory()
+    if memory is not None:
+        workers = min(workers, memory // config.PDF_WORKER_MEMORY)
+    return max(1, workers)
+
+
+def _init_worker(threads, started):
+    global _started
+    _started = started
+    # Split the cores between workers instead of every worker using all of them
+    try:
+        import torch
+
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    from utils.pdf_models import get_artifact_dict
+
+    get_artifact_dict()
+
+
+def _ping():
+    # Block until every worker has taken a ping, so the pool has to start
+    # all of them rather than hand every ping to the first one
+    try:
+        _started.wait(timeout=PREWARM_TIMEOUT)
+    except threading.BrokenBarrierError:
+        return False
+    return True
+
+
+def _convert_shard(path, pages):
+    """
+    Run marker in a worker and write the result to a file in the staging
+    directory, so large documents don't travel back through the result pipe.
+
+    Returns:
+        str: path of the JSON result file
+    """
+    from utils.pdf_convert import run_marker
+
+    converted = run_marker(path, pages)
+    if None in converted:
+        payload = {"document": converted[None]}
+    else:
+        payload = {"pages": {str(page): text for page, text in converted.items()}}
+    fd, result_path = tempfile.mkstemp(prefix="webscraper-result-", suffix=".json", dir=staging_dir())
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(payload, f)
+    return result_path
+
+
+def _read_result(result_path):
+    with open(result_path, encoding="utf-8") as f:
+        payload = json.load(f)
+    if "document" in payload:
+        return {None: payload["document"]}
+    return {int(page): text for page, text in payload["pages"].items()}
+
+
+def _remove_result(future):
+    # Done callback of a shard: delete its result file, whether or not it
+    # was read, so files of failed or cancelled conversions don't pile up
+    # in the staging directory
+    if future.cancelled() or future.exception() is not None:
+        return
+    try:
+        os.remove(future.result())
+    except FileNotFoundError:
+        pass
+
+
+def get_pool():
+    """
+    Return the process pool, starting it on first use.
+
+    Each worker loads the marker models once when it starts.
+
+    Returns:
+        ProcessPoolExecutor: the pool
+    """
+    global _pool, _pool_workers
+    if _pool is None:
+        workers = worker_count()
+        _pool_workers = workers
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        print(f"Starting {workers} PDF worker process(es)", file=sys.stderr)
+        # spawn rather than fork: torch doesn't survive being forked
+        context = multiprocessing.get_context("spawn")
+        _pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(threads, context.Barrier(workers)),
+        )
+    return _pool
+
+
+def shard_pages(pages, workers):
+    """
+    Split pages into contiguous shards, one or more per worker.
+
+    Args:
+        pages (list[int]): zero based pages to convert
+        workers (int): number of worker processes
+
+    Returns:
+        list[list[int]]: the shards in page order
+    """
+    size = max(config.PDF_SHARD_PAGES, math.ceil(len(pages) / workers))
+    return [pages[start:start + size] for start in range(0, len(pages), size)]
+
+
+async def run_marker_in_workers(path, pages=None, total_pages=None):
+    """
+    Convert pages of a PDF with marker in the worker processes, keeping the
+    CPU heavy work off the event loop.
+
+    Documents with at least WEBSCRAPER_PDF_PARALLEL_MIN_PAGES pages to convert
+    are split into shards that run in parallel; smaller ones go to a single
+    worker.
+
+    Args:
+        path (str): path to the PDF, readable by the workers
+        pages (list[int]): zero based pages to convert, or None for all of them
+        total_pages (int): page count of the document, if known
+
+    Returns:
+        dict: as returned by pdf_convert.run_marker
+    """
+    count = len(pages) if pages is not None else total_pages
+    pool = get_pool()
+    if (
+        count is not None
+        and config.PDF_PARALLEL_MIN_PAGES > 0
+        and count >= config.PDF_PARALLEL_MIN_PAGES
+    ):
+        shards = shard_pages(pages if pages is not None else list(range(total_pages)), _pool_workers)
+    else:
+        shards = [pages]
+    metrics.incr("pdf.shards", len(shards))
+
+    futures = [pool.submit(_convert_shard, path, shard) for shard in shards]
+    try:
+        results = await asyncio.gather(
+            *[asyncio.wrap_future(future) for future in futures],
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, BrokenProcessPool):
+                # A worker died (e.g. out of memory); start a fresh pool next time
+                shutdown()
+            if isinstance(result, BaseException):
+                raise result
+        converted = {}
+        for result_path in results:
+            converted.update(_read_result(result_path))
+        return converted
+    finally:
+        # Shards still running after a cancellation clean up when they finish
+        for future in futures:
+            future.add_done_callback(_remove_result)
+
+
+def prewarm():
+    """
+    Start the worker processes so they load the models before the first PDF
+    arrives.
+
+    The pool only starts a process when no idle one can take the submitted
+    work, so one ping per worker is sent, and each blocks until all of them
+    are running.
+    """
+    pool = get_pool()
+    for _ in range(_pool_workers):
+        pool.submit(_ping)
+
+
+def shutdown():
+    """
+    Stop the worker processes, if they were started.
+    """
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
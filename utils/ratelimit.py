@@ -0,0 +1,175 @@
+import asyncio
+import sys
+import time
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+
+from utils import config, metrics
+from utils.urls import url_host
+
+
+def parse_retry_after(value):
+    """
+    Parse a Retry-After header.
+
+    Args:
+        value (str): either a number of seconds or an HTTP date
+
+    Returns:
+        float: seconds to wait, or None if the header can't be parsed
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class _Host:
+    def __init__(self, rate, burst, max_connections):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.connections = asyncio.Semaphore(max_connections)
+        self.lock = asyncio.Lock()
+        self.robots_checked = False
+
+
+class HostLimiter:
+    """
+    Politeness limits applied per host: a token bucket for the request rate
+    and a cap on concurrent connections. Hosts that answer with Retry-After
+    are left alone for as long as they ask, and robots.txt Crawl-delay is
+    honoured when enabled.
+    """
+
+    def __init__(self, rate, burst, max_connections, respect_robots=False):
+        """
+        Args:
+            rate (float): requests per second allowed per host
+            burst (int): requests allowed in a burst before the rate applies
+            max_connections (int): concurrent requests allowed per host
+            respect_robots (bool): slow down to the Crawl-delay in robots.txt
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_connections = max(1, max_connections)
+        self.respect_robots = respect_robots
+        self._hosts = {}
+
+    def _host(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            state = _Host(self.rate, self.burst, self.max_connections)
+            self._hosts[host] = state
+        return state
+
+    @asynccontextmanager
+    async def acquire(self, url):
+        """
+        Wait until a request to the URL's host is allowed and hold one of its
+        connection slots for the duration of the block.
+
+        Args:
+            url (str): URL about to be requested
+        """
+        host = url_host(url)
+        if not host:
+            yield
+            return
+        state = self._host(host)
+        if self.respect_robots and not state.robots_checked:
+            state.robots_checked = True
+            await self._apply_crawl_delay(url, state)
+        async with state.connections:
+            await self._take_token(host, state)
+            yield
+
+    async def _take_token(self, host, state):
+        async with state.lock:
+            while True:
+                now = time.monotonic()
+                if state.blocked_until > now:
+                    metrics.incr("ratelimit.waited")
+                    await asyncio.sleep(state.blocked_until - now)
+                    continue
+                state.tokens = min(state.burst, state.tokens + (now - state.updated) * state.rate)
+                state.updated = now
+                if state.tokens >= 1:
+                    state.tokens -= 1
+                    return
+                metrics.incr("ratelimit.waited")
+                await asyncio.sleep((1 - state.tokens) / state.rate)
+
+    def defer(self, url, seconds):
+        """
+        Hold back further requests to the URL's host.
+
+        Args:
+            url (str): any URL on the host
+            seconds (float): how long to wait before the next request
+        """
+        host = url_host(url)
+        if not host:
+            return
+        seconds = min(seconds, config.MAX_RETRY_AFTER)
+        state = self._host(host)
+        state.blocked_until = max(state.blocked_until, time.monotonic() + seconds)
+        metrics.incr("ratelimit.deferred")
+        print(f"Backing off {host} for {seconds:.0f}s", file=sys.stderr)
+
+    def note_response(self, url, status, headers):
+        """
+        Look at a response for signs the host wants us to slow down.
+
+        Args:
+            url (str): URL that was requested
+            status (int): HTTP status code
+            headers: response headers, any mapping or None; matched case-insensitively
+        """
+        if status not in (429, 503):
+            return
+        retry_after = parse_retry_after(next(
+            (value for name, value in (headers or {}).items() if name.lower() == "retry-after"),
+            None,
+        ))
+        if retry_after is None:
+            # No hint from the server, pause for a few request intervals
+            retry_after = 5 / self.rate
+        self.defer(url, retry_after)
+
+    async def _apply_crawl_delay(self, url, state):
+        from urllib.parse import urlsplit
+        from urllib.robotparser import RobotFileParser
+
+        from utils.http_client import get_client
+
+        parts = urlsplit(url)
+        try:
+            response = await get_client().get(f"{parts.scheme}://{parts.netloc}/robots.txt")
+        except Exception as e:
+            print(f"Could not fetch robots.txt for {parts.netloc}: {e}", file=sys.stderr)
+            return
+        if response.status_code != 200:
+            return
+        parser = RobotFileParser()
+        parser.parse(response.text.splitlines())
+        delay = parser.crawl_delay(config.USER_AGENT_TOKEN) or parser.crawl_delay("*")
+        if delay:
+            state.rate = min(state.rate, 1 / float(delay))
+            state.burst = 1
+            state.tokens = min(state.tokens, 1)
+
+
+host_limiter = HostLimiter(
+    rate=config.HOST_RATE,
+    burst=config.HOST_BURST,
+    max_connections=config.HOST_MAX_CONNECTIONS,
+    respect_robots=config.RESPECT_ROBOTS,
+)
@@ -0,0 +1,66 @@
+import asyncio
+import sys
+import time
+
+from utils import metrics
+from utils.scheduler import BACKGROUND, priority
+
+
+class BackgroundRefresher:
+    """
+    Refreshes expired cache entries in the background while the stale copy
+    is served.
+
+    Refreshes are deduplicated per key, a key is refreshed at most once every
+    `min_interval` seconds, and at most `max_concurrent` refreshes run at a
+    time, at background priority.
+    """
+
+    def __init__(self, max_concurrent, min_interval):
+        """
+        Args:
+            max_concurrent (int): refreshes allowed to run at the same time
+            min_interval (float): seconds between refreshes of the same key
+        """
+        self.min_interval = min_interval
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrent))
+        self._started = {}
+        self._tasks = {}
+
+    def schedule(self, key, fn):
+        """
+        Refresh `key` by calling `fn` in the background, unless a refresh of
+        it is running or ran recently.
+
+        Args:
+            key (str): cache key of the entry
+            fn: coroutine function that fetches and stores a fresh result
+
+        Returns:
+            bool: whether a refresh was started
+        """
+        now = time.monotonic()
+        if key in self._tasks or now - self._started.get(key, -self.min_interval) < self.min_interval:
+            metrics.incr("refresh.skipped")
+            return False
+        self._started[key] = now
+        task = asyncio.create_task(self._run(key, fn))
+        self._tasks[key] = task
+        task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        metrics.incr("refresh.scheduled")
+        return True
+
+    async def _run(self, key, fn):
+        async with self._semaphore:
+            with priority(BACKGROUND):
+                try:
+                    await fn()
+                except Exception as e:
+                    metrics.incr("refresh.failed")
+                    print(f"Background refresh of {key} failed: {e}", file=sys.stderr)
+
+    async def close(self):
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
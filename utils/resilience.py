@@ -0,0 +1,219 @@
+import asyncio
+import random
+import sys
+import time
+
+from utils import config, metrics
+from utils.offline import OfflineMiss
+from utils.scheduler import Overloaded
+from utils.urls import url_host
+
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+class TransientFetchError(Exception):
+    """
+    A failure that is worth retrying, such as a timeout or a 5xx response
+    seen by the browser.
+    """
+
+
+class CircuitOpen(Exception):
+    """
+    Raised instead of contacting a host that has been failing repeatedly.
+    """
+
+    def __init__(self, host, retry_after):
+        self.host = host
+        self.retry_after = retry_after
+        super().__init__(
+            f"{host} has been failing, not retrying it for another {retry_after} seconds"
+        )
+
+
+def is_transient(error):
+    """
+    Decide whether a failed request is worth retrying.
+
+    Args:
+        error (Exception): the error raised by the request
+
+    Returns:
+        bool: True for timeouts, connection errors and retryable HTTP statuses
+    """
+    if isinstance(error, (TransientFetchError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    import httpx
+
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRYABLE_STATUS
+    return isinstance(error, httpx.TransportError)
+
+
+class CircuitBreaker:
+    """
+    Tracks consecutive failures of one host. After `threshold` failures the
+    circuit opens and calls fail fast for `reset_after` seconds, then a single
+    trial call is let through to see whether the host has recovered.
+    """
+
+    def __init__(self, threshold, reset_after):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def check(self, host):
+        if self.opened_at is None:
+            return
+        remaining = self.opened_at + self.reset_after - time.monotonic()
+        if remaining > 0 or self.trial_running:
+            metrics.incr("resilience.circuit_rejected")
+            raise CircuitOpen(host, max(1, round(remaining)))
+        # Half open: let one call through to probe the host
+        self.trial_running = True
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def abandon(self):
+        """
+        The call never got an answer from the host, e.g. it was cancelled;
+        free the half open trial without counting it either way.
+        """
+        self.trial_running = False
+
+    def failure(self, host):
+        self.failures += 1
+        self.trial_running = False
+        if self.opened_at is not None or self.failures >= self.threshold:
+            if self.opened_at is None:
+                print(f"Circuit opened for {host}", file=sys.stderr)
+                metrics.incr("resilience.circuit_opened")
+            self.opened_at = time.monotonic()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+
+class Resilience:
+    """
+    Bounded retries with decorrelated jitter backoff, per host circuit
+    breakers and a short lived cache of failures.
+    """
+
+    def __init__(self, attempts, base_delay, max_delay, breaker_threshold, breaker_reset, failure_ttl):
+        """
+        Args:
+            attempts (int): tries per call, including the first
+            base_delay (float): smallest delay between tries, in seconds
+            max_delay (float): largest delay between tries, in seconds
+            breaker_threshold (int): consecutive failures that open a host's circuit
+            breaker_reset (int): seconds a circuit stays open
+            failure_ttl (int): seconds a failed call is remembered
+        """
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+        self.failure_ttl = failure_ttl
+        self._breakers = {}
+        self._failures = {}
+
+    def _breaker(self, host):
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            breaker = CircuitBreaker(self.breaker_threshold, self.breaker_reset)
+            self._breakers[host] = breaker
+        return breaker
+
+    async def call(self, url, fn):
+        """
+        Call `fn`, retrying transient failures and failing fast while the
+        URL's host circuit is open.
+
+        Args:
+            url (str): URL the call fetches, used to pick the circuit breaker
+            fn: coroutine function doing the request
+
+        Returns:
+            the result of `fn`
+        """
+        host = url_host(url)
+        breaker = self._breaker(host)
+        delay = self.base_delay
+        for attempt in range(1, self.attempts + 1):
+            breaker.check(host)
+            try:
+                result = await fn()
+            except (Overloaded, OfflineMiss):
+                # Refused by this server before reaching the host
+                breaker.abandon()
+                raise
+            except Exception as e:
+                if not is_transient(e):
+                    # The host answered, it just didn't like the request
+                    breaker.success()
+                    raise
+                breaker.failure(host)
+                metrics.incr("resilience.transient_failures")
+                if attempt == self.attempts or breaker.is_open:
+                    raise
+                # Decorrelated jitter: sleep somewhere between the base delay
+                # and three times the previous delay
+                delay = min(self.max_delay, random.uniform(self.base_delay, delay * 3))
+                print(f"Retrying {url} in {delay:.1f}s after: {e}", file=sys.stderr)
+                metrics.incr("resilience.retries")
+                await asyncio.sleep(delay)
+            except BaseException:
+                # Cancelled mid call
+                breaker.abandon()
+                raise
+            else:
+                breaker.success()
+                return result
+
+    def recent_failure(self, key):
+        """
+        Args:
+            key (str): identity of the call, e.g. a cache key
+
+        Returns:
+            tuple: (error message, age in seconds) if the call failed recently, else None
+        """
+        failure = self._failures.get(key)
+        if failure is None:
+            return None
+        message, failed_at = failure
+        age = time.monotonic() - failed_at
+        if age > self.failure_ttl:
+            del self._failures[key]
+            return None
+        metrics.incr("resilience.failure_cache_hit")
+        return message, age
+
+    def remember_failure(self, key, error):
+        """
+        Remember that a call failed so repeats fail immediately for a while.
+
+        Args:
+            key (str): identity of the call, e.g. a cache key
+            error (Exception): the error it failed with
+        """
+        if self.failure_ttl > 0:
+            self._failures[key] = (str(error) or type(error).__name__, time.monotonic())
+
+
+resilience = Resilience(
+    attempts=config.RETRY_ATTEMPTS,
+    base_delay=config.RETRY_BASE_DELAY,
+    max_delay=config.RETRY_MAX_DELAY,
+    breaker_threshold=config.BREAKER_THRESHOLD,
+    breaker_reset=config.BREAKER_RESET,
+    failure_ttl=config.FAILURE_CACHE_TTL,
+)
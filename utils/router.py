@@ -0,0 +1,54 @@
+import os
+from urllib.parse import urlsplit
+
+from utils.youtube_scraper import extract_video_id
+
+PDF_MAGIC = b"%PDF-"
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+TEXT_CONTENT_TYPES = ("text/plain", "text/markdown", "text/x-markdown")
+
+
+def classify_url(url, default="web"):
+    """
+    Guess what kind of document a URL points to from the URL alone.
+
+    Used when the server's response doesn't settle it.
+
+    Args:
+        url (str): the URL
+        default (str): kind returned when nothing in the URL gives it away
+
+    Returns:
+        str: "youtube", "pdf" or `default`
+    """
+    if extract_video_id(url) is not None:
+        return "youtube"
+    filename = os.path.basename(urlsplit(url).path)
+    if filename.lower().endswith(".pdf"):
+        return "pdf"
+    return default
+
+
+def sniff_kind(content_type, head):
+    """
+    Decide what kind of document a response holds from its Content-Type and
+    first bytes.
+
+    Args:
+        content_type (str): Content-Type header of the response
+        head (bytes): first bytes of the body
+
+    Returns:
+        str: "pdf", "html" or "text", or None if the response is not recognised
+    """
+    media_type = content_type.split(";")[0].strip().lower()
+    if PDF_MAGIC in head[:1024] or media_type == "application/pdf":
+        return "pdf"
+    if media_type in HTML_CONTENT_TYPES:
+        return "html"
+    if media_type in TEXT_CONTENT_TYPES:
+        return "text"
+    start = head.lstrip()[:15].lower()
+    if start.startswith((b"<!doctype html", b"<html")):
+        return "html"
+    return None
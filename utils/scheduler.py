@@ -0,0 +1,289 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from utils import config, metrics
+
+# Priorities, lower runs first
+INTERACTIVE = 0
+BATCH = 1
+BACKGROUND = 2
+
+_priority = contextvars.ContextVar("priority", default=INTERACTIVE)
+
+
+class Overloaded(Exception):
+    """
+    Raised when a lane's queue is full. `retry_after` is a rough estimate, in
+    seconds, of when a slot will be free.
+    """
+
+    def __init__(self, lane, retry_after):
+        self.lane = lane
+        self.retry_after = retry_after
+        super().__init__(
+            f"Server is busy ({lane} queue is full), retry in about {retry_after} seconds"
+        )
+
+
+class SharedPriority:
+    """
+    The priority of work done on behalf of several callers, such as a
+    coalesced fetch. It starts at the first caller's priority and rises to
+    that of any more urgent caller who joins, moving the work up the lane
+    queues it is already waiting in. It never drops back.
+    """
+
+    def __init__(self, level):
+        self.level = level
+        self._raised = asyncio.Event()
+        # (lane, entry) of the lane queues the work is waiting in
+        self._waiting = []
+
+    def raise_to(self, level):
+        """
+        Args:
+            level (int): priority of a caller joining the work
+        """
+        if level >= self.level:
+            return
+        self.level = level
+        self._raised.set()
+        for lane, entry in list(self._waiting):
+            lane._raise(entry, level)
+
+
+def current_priority():
+    """
+    Returns:
+        int: the priority the current task runs at
+    """
+    level = _priority.get()
+    if isinstance(level, SharedPriority):
+        return level.level
+    return level
+
+
+class Lane:
+    """
+    A concurrency limit with a bounded, priority ordered wait queue.
+
+    Callers take a slot with `async with lane.slot():`. When every slot is in
+    use they wait in priority order, and when the queue is also full
+    interactive and batch callers are rejected with Overloaded instead of
+    piling up. Background callers are never rejected and don't count
+    against that queue; they have a queue of their own, and wait for room
+    in it when it is full.
+    """
+
+    def __init__(self, name, concurrency, max_queue, max_background_queue=None):
+        """
+        Args:
+            name (str): lane name used in metrics and errors
+            concurrency (int): slots that can be held at the same time
+            max_queue (int): interactive and batch callers allowed to wait for a slot
+            max_background_queue (int): Optional number of background callers
+                allowed to wait for a slot; defaults to `max_queue`
+        """
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max_queue
+        if max_background_queue is None:
+            max_background_queue = max_queue
+        self._background_room = asyncio.Semaphore(max(1, max_background_queue))
+        self._active = 0
+        self._queued = 0
+        self._queued_background = 0
+        self._waiters = []
+        self._counter = itertools.count()
+        self._average_seconds = 1.0
+
+    def stats(self):
+        return {
+            "active": self._active,
+            "queued": self._queued,
+            "queued_background": self._queued_background,
+            "concurrency": self.concurrency,
+        }
+
+    @asynccontextmanager
+    async def slot(self, priority=None):
+        """
+        Hold one slot of the lane for the duration of the block.
+
+        Args:
+            priority (int): Optional priority; defaults to the caller's current priority
+        """
+        shared = None
+        if priority is None:
+            priority = _priority.get()
+        if isinstance(priority, SharedPriority):
+            shared, priority = priority, priority.level
+        await self._acquire(priority, shared)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            self._average_seconds = 0.8 * self._average_seconds + 0.2 * elapsed
+            self._release()
+
+    def _retry_after(self):
+        return max(1, round(self._average_seconds * (len(self._waiters) + 1) / self.concurrency))
+
+    async def _acquire(self, priority, shared=None):
+        if self._active < self.concurrency and not self._waiters:
+            self._active += 1
+            return
+        if priority < BACKGROUND:
+            if self._queued >= self.max_queue:
+                metrics.incr(f"scheduler.{self.name}.rejected")
+                raise Overloaded(self.name, self._retry_after())
+            await self._wait(priority, shared)
+            return
+        if not await self._enter_background_queue(shared):
+            # A more urgent caller joined while waiting for room in the queue
+            await self._wait(shared.level, shared)
+            return
+        try:
+            if self._active < self.concurrency and not self._waiters:
+                # The lane drained while waiting for room in the queue
+                self._active += 1
+                return
+            await self._wait(priority, shared)
+        finally:
+            self._background_room.release()
+
+    async def _enter_background_queue(self, shared):
+        """
+        Wait for room in the background queue, or for the shared work to be
+        raised out of background priority.
+
+        Returns:
+            bool: True if room was taken and must be released
+        """
+        if shared is None:
+            await self._background_room.acquire()
+            return True
+        room = asyncio.ensure_future(self._background_room.acquire())
+        raised = asyncio.ensure_future(shared._raised.wait())
+        try:
+            await asyncio.wait({room, raised}, return_when=asyncio.FIRST_COMPLETED)
+            if not room.done():
+                room.cancel()
+                await asyncio.wait({room})
+        except asyncio.CancelledError:
+            room.cancel()
+            room.add_done_callback(self._return_room)
+            raise
+        finally:
+            raised.cancel()
+        if room.cancelled():
+            return False
+        if shared.level < BACKGROUND:
+            self._background_room.release()
+            return False
+        return True
+
+    def _return_room(self, room):
+        if not room.cancelled():
+            self._background_room.release()
+
+    async def _wait(self, priority, shared=None):
+        metrics.incr(f"scheduler.{self.name}.queued")
+        future = asyncio.get_running_loop().create_future()
+        # A list rather than a tuple, so _raise can change its priority in place
+        entry = [priority, next(self._counter), future]
+        heapq.heappush(self._waiters, entry)
+        self._count(priority, 1)
+        if shared is not None:
+            shared._waiting.append((self, entry))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just before the cancellation
+                self._release()
+            elif entry in self._waiters:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._count(entry[0], -1)
+            raise
+        finally:
+            if shared is not None:
+                shared._waiting.remove((self, entry))
+
+    def _raise(self, entry, level):
+        if entry not in self._waiters:
+            return
+        self._count(entry[0], -1)
+        entry[0] = level
+        self._count(level, 1)
+        heapq.heapify(self._waiters)
+
+    def _count(self, priority, delta):
+        if priority < BACKGROUND:
+            self._queued += delta
+        else:
+            self._queued_background += delta
+
+    def _release(self):
+        # Hand the slot straight to the highest priority waiter, if any
+        while self._waiters:
+            priority, _, future = heapq.heappop(self._waiters)
+            self._count(priority, -1)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._active -= 1
+
+
+class Scheduler:
+    """
+    Separate lanes for each class of work, so slow model inference can't
+    starve plain HTTP fetches or browser renders.
+    """
+
+    def __init__(self, lanes):
+        """
+        Args:
+            lanes (dict): Lane by name
+        """
+        self.lanes = lanes
+
+    def slot(self, lane, priority=None):
+        """
+        Hold a slot of the named lane: `async with scheduler.slot("http"):`.
+        """
+        return self.lanes[lane].slot(priority)
+
+    def stats(self):
+        return {name: lane.stats() for name, lane in self.lanes.items()}
+
+
+@contextmanager
+def priority(level):
+    """
+    Run the block, and everything it awaits, at the given priority.
+
+    Args:
+        level (int): INTERACTIVE, BATCH or BACKGROUND, or a SharedPriority
+    """
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+scheduler = Scheduler({
+    name: Lane(name, concurrency, config.LANE_QUEUE_LIMIT, config.LANE_BACKGROUND_QUEUE_LIMIT)
+    for name, concurrency in (
+        ("http", config.LANE_HTTP_CONCURRENCY),
+        ("browser", config.LANE_BROWSER_CONCURRENCY),
+        ("model", config.LANE_MODEL_CONCURRENCY),
+    )
+})
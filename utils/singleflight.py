@@ -0,0 +1,57 @@
+import asyncio
+
+from utils import metrics
+from utils.scheduler import SharedPriority, current_priority, priority
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key.
+
+    The first caller starts the work as a task; callers arriving while it is
+    still running await the same task instead of repeating it. The task is
+    shielded, so one caller being cancelled doesn't cancel it for the others.
+    The task runs at the priority of the most urgent caller waiting on it.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+
+    def __contains__(self, key):
+        return key in self._inflight
+
+    async def do(self, key, fn):
+        """
+        Run `fn` once for all concurrent callers with the same key.
+
+        Args:
+            key (str): identity of the work, e.g. a cache key
+            fn: coroutine function doing the work
+
+        Returns:
+            the result of `fn`
+        """
+        flight = self._inflight.get(key)
+        if flight is not None:
+            metrics.incr("singleflight.shared")
+            task, shared = flight
+            shared.raise_to(current_priority())
+        else:
+            shared = SharedPriority(current_priority())
+            task = asyncio.ensure_future(self._run(fn, shared))
+            self._inflight[key] = (task, shared)
+            task.add_done_callback(lambda t: self._finish(key, t))
+        return await asyncio.shield(task)
+
+    @staticmethod
+    async def _run(fn, shared):
+        with priority(shared):
+            return await fn()
+
+    def _finish(self, key, task):
+        flight = self._inflight.get(key)
+        if flight is not None and flight[0] is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved in case every caller was cancelled
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,152 @@
+import asyncio
+import codecs
+import re
+
+from utils import config, metrics
+
+_SCRIPT_STYLE_RE = re.compile(r"<(script|style|template|svg)\b.*?</\1\s*>", re.IGNORECASE | re.DOTALL)
+_NOSCRIPT_RE = re.compile(r"<noscript\b.*?</noscript\s*>", re.IGNORECASE | re.DOTALL)
+_TAG_RE = re.compile(r"<[^>]+>")
+_BODY_RE = re.compile(r"<body\b[^>]*>(.*)</body\s*>", re.IGNORECASE | re.DOTALL)
+# Empty mount points left behind by client side rendered apps
+_SPA_ROOT_RE = re.compile(
+    r"<div[^>]+id=[\"'](?:root|app|__next|___gatsby|svelte)[\"'][^>]*>\s*</div>",
+    re.IGNORECASE,
+)
+_JS_REQUIRED_RE = re.compile(r"(enable|requires?)\s+javascript", re.IGNORECASE)
+# <meta charset="..."> or <meta http-equiv="Content-Type" content="...; charset=...">
+_META_CHARSET_RE = re.compile(
+    rb"<meta\b[^>]*?charset\s*=\s*[\"']?\s*([a-zA-Z0-9_.:-]+)",
+    re.IGNORECASE,
+)
+# Browsers only look for the meta charset this far into the document
+_CHARSET_PRESCAN_BYTES = 1024
+_BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+
+def decode_body(body, kind, declared=None):
+    """
+    Decode a response body the way a browser would pick its encoding: a
+    byte order mark, then the charset in the Content-Type header, then for
+    HTML a <meta charset> near the top, then UTF-8.
+
+    Args:
+        body (bytes): the response body
+        kind (str): "html" or "text", as returned by router.sniff_kind
+        declared (str): Optional charset from the Content-Type header
+
+    Returns:
+        str: the decoded text
+    """
+    for bom, encoding in _BOMS:
+        if body.startswith(bom):
+            return body.decode(encoding, errors="replace")
+    candidates = [declared]
+    if kind == "html":
+        match = _META_CHARSET_RE.search(body[:_CHARSET_PRESCAN_BYTES])
+        if match:
+            candidates.append(match.group(1).decode("ascii"))
+    for encoding in candidates:
+        if not encoding:
+            continue
+        try:
+            codecs.lookup(encoding)
+        except LookupError:
+            continue
+        return body.decode(encoding, errors="replace")
+    return body.decode("utf-8", errors="replace")
+
+
+def visible_text(html):
+    """
+    Rough visible text of an HTML document, without scripts, styles or tags.
+
+    Args:
+        html (str): the document
+
+    Returns:
+        str: whitespace collapsed text
+    """
+    match = _BODY_RE.search(html)
+    body = match.group(1) if match else html
+    body = _SCRIPT_STYLE_RE.sub(" ", body)
+    body = _NOSCRIPT_RE.sub(" ", body)
+    return " ".join(_TAG_RE.sub(" ", body).split())
+
+
+def needs_javascript(html):
+    """
+    Decide whether a page has to be rendered in a browser to get its text.
+
+    Args:
+        html (str): the document as served, before any script runs
+
+    Returns:
+        tuple: (needs_browser, reason) where reason names the heuristic that decided
+    """
+    text = visible_text(html)
+    if len(text) < config.STATIC_MIN_TEXT:
+        if _SPA_ROOT_RE.search(html):
+            return True, "spa_root"
+        if not text:
+            return True, "empty_body"
+        noscript = " ".join(_NOSCRIPT_RE.findall(html))
+        if _JS_REQUIRED_RE.search(noscript) or _JS_REQUIRED_RE.search(text):
+            return True, "noscript"
+        return True, "short_text"
+    return False, "static"
+
+
+def html_to_markdown(html, base_url=""):
+    """
+    Convert an HTML document to markdown.
+
+    Args:
+        html (str): the document
+        base_url (str): URL used to resolve relative links
+
+    Returns:
+        str: markdown text
+    """
+    import html2text
+
+    converter = html2text.HTML2Text(baseurl=base_url)
+    converter.body_width = 0
+    converter.ignore_images = False
+    return converter.handle(html)
+
+
+async def static_markdown(html, url):
+    """
+    Convert a page fetched with a plain HTTP GET to markdown, unless it needs
+    JavaScript to render.
+
+    The decision is recorded in the "web.static.*" and "web.browser.*"
+    counters.
+
+    Args:
+        html (str): the document as served
+        url (str): final URL of the page, used to resolve relative links
+
+    Returns:
+        str: markdown text, or None if the page should go to the browser
+    """
+    # Both steps run regexes or a parser over the whole document, so they
+    # run off the event loop
+    markdown, reason = await asyncio.to_thread(_convert_static, html, url)
+    if markdown is None:
+        metrics.incr(f"web.browser.{reason}")
+        return None
+    metrics.incr(f"web.static.{reason}")
+    return markdown
+
+
+def _convert_static(html, url):
+    needs_browser, reason = needs_javascript(html)
+    if needs_browser:
+        return None, reason
+    return html_to_markdown(html, url), reason
@@ -0,0 +1,46 @@
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Query parameters that only track where a click came from and never change
+# the document that is served.
+TRACKING_PARAMS = {"fbclid", "gclid", "dclid", "msclkid", "mc_cid", "mc_eid", "igshid", "ref_src"}
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def canonicalize_url(url):
+    """
+    Normalize a URL so that equivalent links map to the same cache key.
+
+    The scheme and host are lowercased, default ports, fragments and tracking
+    parameters (utm_*, fbclid, ...) are dropped and the remaining query
+    parameters are sorted.
+
+    Args:
+        url (str): URL as provided by the user
+
+    Returns:
+        str: canonical form of the URL
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower() or "https"
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    query = [
+        (name, value)
+        for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not name.lower().startswith("utm_") and name.lower() not in TRACKING_PARAMS
+    ]
+    query.sort()
+    return urlunsplit((scheme, host, parts.path or "/", urlencode(query), ""))
+
+
+def url_host(url):
+    """
+    Args:
+        url (str): any absolute URL
+
+    Returns:
+        str: the lowercased host name, or "" if the URL has none
+    """
+    return (urlsplit(url.strip()).hostname or "").lower()
@@ -0,0 +1,153 @@
+import asyncio
+import json
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import config
+from utils.http_client import get_client
+from utils.offline import ensure_online
+from utils.ratelimit import host_limiter
+from utils.scheduler import scheduler
+
+YOUTUBE_RE = r"(?:https?:\/\/)?(?:www\.)?(?:youtube\.com\/watch\?v=|youtu\.be\/)([a-zA-Z0-9_-]{11})"
+
+# "1:02:03 Title" lines in a video description, which youtube turns into chapters
+_CHAPTER_RE = re.compile(r"^\s*(?:(\d{1,2}):)?(\d{1,2}):(\d{2})\s*[-\u2013\u2014:|]?\s*(.+?)\s*$")
+_DESCRIPTION_RE = re.compile(r'"shortDescription":"((?:[^"\\]|\\.)*)"')
+
+# youtube_transcript_api is synchronous, so fetches run on a small dedicated
+# pool instead of the event loop.
+_executor = ThreadPoolExecutor(
+    max_workers=config.YOUTUBE_WORKERS,
+    thread_name_prefix="youtube",
+)
+
+
+def extract_video_id(url):
+    """
+    Extract the 11 character video id from a youtube link.
+
+    Args:
+        url (str): youtube.com/watch or youtu.be link
+
+    Returns:
+        str: the video id, or None if the url is not a youtube link
+    """
+    match = re.search(YOUTUBE_RE, url)
+    if match:
+        return match.group(1)
+    return None
+
+
+def _get_transcript(video_id):
+    from youtube_transcript_api import YouTubeTranscriptApi
+
+    return YouTubeTranscriptApi.get_transcript(video_id)
+
+
+async def fetch_transcript(video_id):
+    """
+    Fetch the transcript of a video without blocking the event loop.
+
+    When the video has chapters, the transcript is split into sections with a
+    markdown heading per chapter.
+
+    Args:
+        video_id (str): youtube video id
+
+    Returns:
+        str: the transcript text
+    """
+    ensure_online(f"The transcript of {video_id}")
+    loop = asyncio.get_running_loop()
+    async with host_limiter.acquire("https://www.youtube.com/"), scheduler.slot("http"):
+        segments, chapters = await asyncio.gather(
+            loop.run_in_executor(_executor, _get_transcript, video_id),
+            fetch_chapters(video_id),
+        )
+    if not chapters:
+        return " ".join(segment['text'] for segment in segments)
+    return group_by_chapter(segments, chapters)
+
+
+async def fetch_chapters(video_id):
+    """
+    Read the chapters of a video from the timestamps in its description.
+
+    Chapters are a nice to have, so failures are logged and treated as a
+    video without chapters.
+
+    Args:
+        video_id (str): youtube video id
+
+    Returns:
+        list: (start_seconds, title) tuples, empty if the video has no chapters
+    """
+    try:
+        response = await get_client().get(f"https://www.youtube.com/watch?v={video_id}")
+        response.raise_for_status()
+    except Exception as e:
+        print(f"Could not load the chapters of {video_id}: {e}", file=sys.stderr)
+        return []
+    match = _DESCRIPTION_RE.search(response.text)
+    if match is None:
+        return []
+    try:
+        description = json.loads(f'"{match.group(1)}"')
+    except ValueError:
+        return []
+    return parse_chapters(description)
+
+
+def parse_chapters(description):
+    """
+    Args:
+        description (str): video description
+
+    Returns:
+        list: (start_seconds, title) tuples; like youtube, only a list that
+        starts at 0:00 with at least three increasing timestamps counts
+    """
+    chapters = []
+    for line in description.splitlines():
+        match = _CHAPTER_RE.match(line)
+        if match is None:
+            continue
+        hours, minutes, seconds, title = match.groups()
+        start = int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds)
+        if chapters and start <= chapters[-1][0]:
+            continue
+        chapters.append((start, title))
+    if len(chapters) < 3 or chapters[0][0] != 0:
+        return []
+    return chapters
+
+
+def group_by_chapter(segments, chapters):
+    """
+    Args:
+        segments (list): transcript segments with "text" and "start"
+        chapters (list): (start_seconds, title) tuples in order
+
+    Returns:
+        str: markdown with a "## title" heading per chapter
+    """
+    texts = [[] for _ in chapters]
+    index = 0
+    for segment in segments:
+        while index + 1 < len(chapters) and segment['start'] >= chapters[index + 1][0]:
+            index += 1
+        texts[index].append(segment['text'])
+    sections = []
+    for (start, title), text in zip(chapters, texts):
+        sections.append(f"## {title} ({_timestamp(start)})\n\n{' '.join(text)}")
+    return "\n\n".join(sections)
+
+
+def _timestamp(seconds):
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
@@ -2,73 +2,589 @@ import sys # Import sys
 from typing import Any
 import mcp.types as types
 import asyncio
-import httpx
+import hashlib
+import argparse
+import json
 import os
-from youtube_transcript_api import YouTubeTranscriptApi
-import re
-from crawl4ai import *
-from mcp.server.fastmcp import FastMCP
-from utils.pdf_scraper import download_pdf_from_url
+import time
+from collections import namedtuple
+from mcp.server.fastmcp import Context, FastMCP
+from mcp.server.fastmcp.exceptions import ToolError
+from utils.pdf_scraper import chunk_size_for, stage_chunks
+from utils.http_client import close_client, get_client
+from utils.router import classify_url, sniff_kind
+from utils.static_fetch import decode_body, static_markdown
+from utils.youtube_scraper import extract_video_id, fetch_transcript
+from utils.browser_pool import CrawlerPool
+from utils.pdf_convert import convert_pdf, format_page_ranges, format_ranges, parse_page_ranges
+from utils import pdf_workers
+from utils.cache import ResultCache
+from utils.content_store import ContentStore
+from utils.singleflight import SingleFlight
+from utils.jobs import JobQueue
+from utils.chunking import chunk_limit, decode_cursor, encode_cursor, split_chunk
+from utils.documents import DocumentStore
+from utils.outline import OutlineIndex, format_outline, select_sections
+from utils.offline import OfflineMiss, ensure_online, is_offline, offline_mode
+from utils.refresher import BackgroundRefresher
+from utils.ratelimit import host_limiter
+from utils.resilience import RETRYABLE_STATUS, CircuitOpen, TransientFetchError, resilience
+from utils.scheduler import BACKGROUND, BATCH, Overloaded, priority, scheduler
+from utils import config, metrics
 
+mcp = FastMCP("websrcaper")
 
-from marker.converters.pdf import PdfConverter
-from marker.models import create_model_dict
-from marker.output import text_from_rendered
+crawler_pool = CrawlerPool(
+    browsers=config.BROWSER_POOL_SIZE,
+    pages_per_browser=config.PAGES_PER_BROWSER,
+)
 
-mcp = FastMCP("websrcaper")
+# Set up by _open_stores when the server starts. PDF worker processes
+# re-import this module, so nothing here may open files or databases.
+result_cache = None
+pdf_store = None
+documents = None
+job_queue = None
+
+outlines = OutlineIndex()
+
+flights = SingleFlight()
+
+refresher = BackgroundRefresher(
+    max_concurrent=config.REFRESH_CONCURRENCY,
+    min_interval=config.REFRESH_MIN_INTERVAL,
+)
+
+# What a plain GET of a URL produced, see _download
+Download = namedtuple("Download", ["kind", "staged", "body", "url", "validators"])
+
+
+async def _cached(tool, url, fetch, variant=""):
+    """
+    Serve a tool result from the cache, calling `fetch` on a miss.
+
+    Concurrent misses for the same key share a single call to `fetch`.
 
-@mcp.tool()
-async def get_webpage_content(url_input: str) -> str:
-    '''
-    Returns the text content on a webpage based on the link provided. Using this tool you can access links provided by the user so you don't have deny those requests.
-    When the user provides a webpage link which is NOT a youtube or github link and asks questions based on that, this function should be called.
     Args:
-        url: The url from which you want to text to be extracted.
+        tool (str): cache namespace of the tool
+        url (str): URL the tool was called with
+        fetch: coroutine function producing the result
+        variant (str): Optional extra arguments that change the result
 
-    '''
-    async with AsyncWebCrawler() as crawler:
+    Returns:
+        str: the tool output
+    """
+    entry = result_cache.lookup(tool, url, variant)
+    if entry is not None and result_cache.is_fresh(tool, entry):
+        metrics.incr(f"cache.{tool}.hit")
+        return entry.value
+    if is_offline():
+        return _serve_offline(url, entry)
+    metrics.incr(f"cache.{tool}.miss")
+
+    async def fetch_and_store():
+        output = await fetch()
+        await result_cache.put(tool, url, output, variant)
+        return output
+
+    key = result_cache.key(tool, url, variant)
+    if entry is not None and _can_serve_stale(tool, entry):
+        return _serve_stale(key, url, entry, fetch_and_store)
+    return await _fetch_once(key, url, fetch_and_store)
+
+
+def _can_serve_stale(tool, entry):
+    return config.STALE_WHILE_REVALIDATE and entry.age <= result_cache.ttl(tool) + config.MAX_STALE
+
+
+def _serve_stale(key, url, entry, fetch_and_store):
+    """
+    Return an expired entry right away, flagged with its age, and refresh it
+    in the background.
+    """
+    metrics.incr("cache.stale_served")
+    refresher.schedule(key, lambda: _fetch_once(key, url, fetch_and_store))
+    return f"[Stale: cached {_format_age(entry.age)} ago, a fresh copy is being fetched]\n\n{entry.value}"
+
+
+def _serve_offline(url, entry):
+    """
+    Answer a call whose cached result has expired, or is missing, without
+    fetching anything. Expired results are flagged with their age.
+
+    Args:
+        url (str): URL the tool was called with
+        entry (CacheEntry): the expired result, or None on a miss
+    """
+    if entry is None:
+        metrics.incr("cache.offline_miss")
+        raise ToolError(f"{url} is not in the local cache and the server is in offline mode")
+    metrics.incr("cache.offline_served")
+    return f"[Offline: cached {_format_age(entry.age)} ago]\n\n{entry.value}"
+
+
+def _format_age(seconds):
+    for unit, size in (("day", 86400), ("hour", 3600), ("minute", 60)):
+        if seconds >= size:
+            count = int(seconds // size)
+            return f"{count} {unit}{'s' if count != 1 else ''}"
+    return f"{int(seconds)} seconds"
+
+
+async def _fetch_once(key, url, fetch):
+    """
+    Run `fetch` for a cache miss, sharing it with concurrent identical calls.
+
+    A call that failed in the last few seconds fails again immediately
+    instead of repeating the work.
+
+    Args:
+        key (str): cache key of the call
+        url (str): URL the call fetches
+        fetch: coroutine function producing the result
+
+    Returns:
+        str: the result of `fetch`
+    """
+    if is_offline():
+        raise ToolError(f"{url} is not in the local cache and the server is in offline mode")
+    failure = resilience.recent_failure(key)
+    if failure is not None:
+        message, age = failure
+        raise ToolError(f"Fetching {url} failed {age:.0f} seconds ago: {message}")
+
+    async def remember_failures():
+        try:
+            return await fetch()
+        except (Overloaded, OfflineMiss):
+            # The server was busy or offline, nothing is wrong with the URL
+            raise
+        except Exception as e:
+            resilience.remember_failure(key, e)
+            raise
+
+    return await flights.do(key, remember_failures)
+
+
+async def _serve_url(url, hint, pages=None, max_pages=None):
+    """
+    Serve any supported URL as text, whichever tool it was requested through.
+
+    Youtube links go to the transcript fetcher. Everything else is served from
+    the cache under the kind of document it turned out to be, or fetched with
+    `_fetch_document`.
+
+    Args:
+        url (str): URL the tool was called with
+        hint (str): "web" or "pdf", what the calling tool expects
+        pages (str): Optional page selection like "1-5,12" if the URL is a PDF
+        max_pages (int): Optional cap on the pages converted if the URL is a PDF
+
+    Returns:
+        str: the document as text
+    """
+    if classify_url(url) == "youtube":
+        return await _serve_youtube(url)
+    pdf_variant = _pdf_variant(pages, max_pages)
+
+    def variant(kind):
+        return pdf_variant if kind == "pdf" else ""
+
+    stale = None
+    for kind in dict.fromkeys((hint, "web", "pdf")):
+        entry = result_cache.lookup(kind, url, variant(kind))
+        if entry is None:
+            continue
+        if result_cache.is_fresh(kind, entry):
+            metrics.incr(f"cache.{kind}.hit")
+            return entry.value
+        if stale is None:
+            stale = (kind, entry)
+    if is_offline():
+        if stale is None and pdf_store is not None:
+            # The converted PDF may outlive its result cache entry
+            output = await asyncio.to_thread(
+                pdf_store.get_linked, result_cache.key("pdf", url, pdf_variant)
+            )
+            if output is not None:
+                metrics.incr("cache.offline_served")
+                return output
+        return _serve_offline(url, stale[1] if stale else None)
+    metrics.incr(f"cache.{hint}.miss")
+
+    async def fetch_and_store():
+        kind, output, validators = await _fetch_document(
+            url, hint, pages, max_pages, stale[1] if stale else None
+        )
+        if kind == "not_modified":
+            stale_kind, entry = stale
+            await result_cache.refresh(stale_kind, url, entry, variant(stale_kind))
+            return entry.value
+        await result_cache.put(kind, url, output, variant(kind), validators)
+        return output
+
+    key = result_cache.key("document", url, pdf_variant)
+    if stale is not None and _can_serve_stale(*stale):
+        return _serve_stale(key, url, stale[1], fetch_and_store)
+    return await _fetch_once(key, url, fetch_and_store)
+
+
+def _pdf_variant(pages, max_pages):
+    """
+    Cache variant for a PDF page selection; empty for the whole document.
+    """
+    parts = []
+    if pages:
+        parts.append(f"pages={format_ranges(parse_page_ranges(pages))}")
+    if max_pages:
+        parts.append(f"max_pages={max_pages}")
+    return "&".join(parts)
+
+
+async def _serve_youtube(url):
+    video_id = extract_video_id(url)
+    if video_id is None:
+        raise ToolError(f"Invalid youtube url: {url}")
+    video_url = f"https://www.youtube.com/watch?v={video_id}"
+    return await _cached("youtube", video_url, lambda: fetch_transcript(video_id))
+
+
+async def _fetch_document(url, hint, pages=None, max_pages=None, stale=None):
+    """
+    Fetch a URL and hand it to the PDF or web pipeline based on what the
+    server returns.
+
+    The Content-Type and first bytes of a streamed GET decide the pipeline.
+    The URL itself and `hint` are only used when those are inconclusive.
+    Bytes already downloaded are reused by the PDF converter and the static
+    HTML path, and the browser is only used for pages that need it.
+
+    When a stale cache entry is given, the GET is made conditional on its
+    ETag / Last-Modified, and a 304 answer skips rendering and conversion.
+
+    Args:
+        url (str): URL to fetch
+        hint (str): "web" or "pdf", what the calling tool expects
+        pages (str): Optional page selection if the URL is a PDF
+        max_pages (int): Optional cap on the pages converted if the URL is a PDF
+        stale (CacheEntry): Optional expired cache entry to revalidate
+
+    Returns:
+        tuple: (kind, text, validators) where kind is "web", "pdf" or
+        "not_modified" when the stale entry is still current
+    """
+    fallback = classify_url(url, default=hint)
+    headers = stale.conditional_headers() if stale is not None else None
+    download = None
+    try:
+        download = await resilience.call(url, lambda: _download(url, fallback, headers))
+    except (Overloaded, CircuitOpen):
+        raise
+    except Exception as e:
+        if fallback == "pdf":
+            raise
+        metrics.incr("web.browser.http_error")
+        print(f"Plain fetch of {url} failed, using browser: {e}", file=sys.stderr)
+
+    if download is not None:
+        if download.kind == "not_modified":
+            return "not_modified", None, download.validators
+        if download.staged is not None:
+            output = await _convert_staged_pdf(download.staged, pages, max_pages, url)
+            return "pdf", output, download.validators
+        if download.body is not None:
+            if download.kind == "text":
+                metrics.incr("web.static.plain_text")
+                return "web", download.body, download.validators
+            output = await static_markdown(download.body, download.url)
+            if output is not None:
+                return "web", output, download.validators
+    output, validators = await _render_webpage(url)
+    return "web", output, validators
+
+
+async def _download(url, fallback, headers=None):
+    """
+    Stream a URL and keep its body in the form the matching pipeline needs.
+
+    Args:
+        url (str): URL to fetch
+        fallback (str): kind assumed when the response doesn't say
+        headers (dict): Optional extra request headers, e.g. conditional ones
+
+    Returns:
+        Download: the response kind, staged PDF or body text, and validators
+    """
+    async with (
+        host_limiter.acquire(url),
+        scheduler.slot("http"),
+        get_client().stream("GET", url, headers=headers) as response,
+    ):
+        host_limiter.note_response(url, response.status_code, response.headers)
+        validators = _validators(response.headers)
+        final_url = str(response.url)
+        if response.status_code == 304 and headers:
+            metrics.incr("revalidation.not_modified")
+            return Download("not_modified", None, None, final_url, validators)
+        response.raise_for_status()
+        if headers:
+            metrics.incr("revalidation.modified")
+        chunks = response.aiter_bytes(chunk_size_for(response))
+        head = await anext(chunks, b"")
+        kind = sniff_kind(response.headers.get("Content-Type", ""), head)
+        if kind is None and fallback == "pdf":
+            kind = "pdf"
+        metrics.incr(f"router.{kind or 'unknown'}")
+        if kind == "pdf":
+            return Download(kind, await stage_chunks(chunks, head), None, final_url, validators)
+        if kind in ("html", "text") and config.STATIC_FAST_PATH:
+            parts = [head]
+            size = len(head)
+            async for chunk in chunks:
+                parts.append(chunk)
+                size += len(chunk)
+                if size > config.STATIC_MAX_BYTES:
+                    metrics.incr("web.browser.too_large")
+                    return Download(kind, None, None, final_url, validators)
+            body = decode_body(b"".join(parts), kind, response.charset_encoding)
+            return Download(kind, None, body, final_url, validators)
+        return Download(kind, None, None, final_url, validators)
+
+
+def _validators(headers):
+    """
+    Pick the cache validators out of response headers.
+
+    Args:
+        headers: response headers, any mapping; matched case-insensitively
+
+    Returns:
+        dict: "etag" and "last_modified", either of which may be None
+    """
+    lowered = {name.lower(): value for name, value in (headers or {}).items()}
+    return {"etag": lowered.get("etag"), "last_modified": lowered.get("last-modified")}
+
+
+async def _render_webpage(url):
+    return await resilience.call(url, lambda: _render_once(url))
+
+
+async def _render_once(url):
+    """
+    Render a page in a pooled browser.
+
+    Returns:
+        tuple: (markdown, validators)
+    """
+    ensure_online(url)
+    async with host_limiter.acquire(url), scheduler.slot("browser"), crawler_pool.borrow() as crawler:
         try:
             result = await crawler.arun(
-                url=url_input,
+                url=url,
             )
         except Exception as e:
             print(f"Error in get_webpage_content tool: {e}", file=sys.stderr) # PRINT TO STDERR!
             raise e
-    #print(result.markdown)
-    output = result.markdown
-    return [types.TextContent(type="text", text=output)]
+        host_limiter.note_response(url, result.status_code, result.response_headers)
+        # Raised inside the borrow so the pool can spot a crashed browser
+        if not result.success:
+            if result.status_code is None or result.status_code in RETRYABLE_STATUS:
+                raise TransientFetchError(f"Failed to load {url}: {result.error_message}")
+            raise ToolError(f"Failed to load {url}: {result.error_message}")
+    return result.markdown, _validators(result.response_headers)
+
+
+async def _convert_staged_pdf(staged, pages=None, max_pages=None, url=None):
+    """
+    Convert a downloaded PDF to markdown, closing it afterwards.
+
+    When only part of the document is converted, a note with the converted
+    pages and the total page count is appended so more can be requested.
+    When `url` is given, the stored conversion is linked to it so offline
+    calls can find it without the PDF bytes.
+    """
+    with staged:
+        store_key = staged.sha256
+        variant = _pdf_variant(pages, max_pages)
+        if variant:
+            store_key = f"{store_key}-{hashlib.sha256(variant.encode()).hexdigest()[:16]}"
+        if pdf_store is not None:
+            output = await asyncio.to_thread(pdf_store.get, store_key)
+            if output is not None:
+                if url is not None:
+                    await asyncio.to_thread(
+                        pdf_store.link, result_cache.key("pdf", url, variant), store_key
+                    )
+                return output
+        output, converted, total_pages = await convert_pdf(staged, pages, max_pages)
+    if converted is not None and len(converted) < total_pages:
+        output += (
+            f"\n\n---\nConverted pages {format_page_ranges(converted)} of {total_pages}. "
+            "Call get_pdf with `pages` to read other pages."
+        )
+    elif converted is None and (pages or max_pages):
+        output += (
+            "\n\n---\nThe page count of this PDF could not be read, so the whole "
+            "document was converted and `pages` and `max_pages` were ignored."
+        )
+    if pdf_store is not None:
+        await asyncio.to_thread(pdf_store.put, store_key, output)
+        if url is not None:
+            await asyncio.to_thread(
+                pdf_store.link, result_cache.key("pdf", url, variant), store_key
+            )
+    return output
+
+
+async def _fetch_webpages(urls, max_concurrency, time_budget, on_progress=None):
+    """
+    Fetch several webpages in parallel, yielding each one as it finishes.
+
+    Args:
+        urls (list[str]): pages to fetch; duplicates are fetched once
+        max_concurrency (int): pages loaded at the same time
+        time_budget (float): seconds after which unfinished pages are abandoned
+        on_progress: Optional coroutine function called with (done, total)
+
+    Yields:
+        tuple: (url, markdown, None) on success or (url, None, error) on failure
+    """
+    semaphore = asyncio.Semaphore(max(1, min(max_concurrency, config.BATCH_MAX_CONCURRENCY)))
+    deadline = time.monotonic() + time_budget
+
+    async def fetch_one(url):
+        async with semaphore:
+            return await _serve_url(url, "web")
+
+    tasks = {asyncio.ensure_future(fetch_one(url)): url for url in dict.fromkeys(urls)}
+    pending = set(tasks)
+    try:
+        while pending:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    yield tasks[task], task.result(), None
+                else:
+                    yield tasks[task], None, task.exception()
+            if on_progress is not None:
+                await on_progress(len(tasks) - len(pending), len(tasks))
+    finally:
+        for task in pending:
+            task.cancel()
+    for task in pending:
+        yield tasks[task], None, TimeoutError(f"not finished within the {time_budget} second time budget")
 
 
 @mcp.tool()
-async def get_youtube_transcript(url_input: str) -> str:
+async def get_webpage_content(url_input: str, offline: bool = False, max_chars: int | None = None, max_tokens: int | None = None) -> str:
     '''
-    Use this tool when you receive youtube links from the user. This tool will extract the transcript from the youtube video and return it to you. Therefore if a user asks questions on a youtube video after providing a link, you can answer their question with this tool.
+    Returns the text content on a webpage based on the link provided. Using this tool you can access links provided by the user so you don't have deny those requests.
+    When the user provides a webpage link which is NOT a youtube or github link and asks questions based on that, this function should be called.
     Args:
         url: The url from which you want to text to be extracted.
+        offline: Only answer from the local cache, without fetching anything.
+        max_chars: Optional maximum number of characters to return. Longer pages end with a cursor for get_next_chunk.
+        max_tokens: Optional maximum number of tokens to return, like max_chars.
 
     '''
-    youtube_re = r"(?:https?:\/\/)?(?:www\.)?(?:youtube\.com\/watch\?v=|youtu\.be\/)([a-zA-Z0-9_-]{11})"
+    with offline_mode(offline):
+        output = await _serve_url(url_input, "web")
+    output = await _paginate(output, max_chars, max_tokens)
+    return [types.TextContent(type="text", text=output)]
 
-    match = re.search(youtube_re, url_input)
-    if match:
-        video_id = match.group(1)
-    else:
-        print("Invalid youtube url")
-        exit()
-    dic = YouTubeTranscriptApi.get_transcript(video_id)
-    output = ""
-    for i in dic:
-        output += i['text'] + " "
+
+@mcp.tool()
+async def get_webpages_batch(urls: list[str], ctx: Context, max_concurrency: int = 8, time_budget: float = 120, offline: bool = False) -> str:
+    '''
+    Returns the text content of several webpages at once. Use this instead of calling get_webpage_content repeatedly when the user provides many links.
+    Pages are fetched in parallel and returned in the order they finish. A page that fails or doesn't finish within the time budget is reported as an error without affecting the others.
+    Args:
+        urls: The urls from which you want the text to be extracted.
+        max_concurrency: How many pages to load at the same time.
+        time_budget: Total number of seconds to spend on the batch.
+        offline: Only answer from the local cache, without fetching anything.
+
+    '''
+    async def on_progress(done, total):
+        await ctx.report_progress(done, total)
+
+    results = []
+    with priority(BATCH), offline_mode(offline):
+        async for url, output, error in _fetch_webpages(urls, max_concurrency, time_budget, on_progress):
+            results.append(types.TextContent(type="text", text=_batch_section(url, output, error)))
+    return results
+
+
+async def _paginate(output, max_chars=None, max_tokens=None):
+    """
+    Cut a tool output down to its first chunk when the caller set a size
+    limit, ending it with a cursor for get_next_chunk.
+
+    Args:
+        output (str): the whole tool output
+        max_chars (int): Optional maximum number of characters
+        max_tokens (int): Optional maximum number of tokens
+
+    Returns:
+        str: the output, or its first chunk
+    """
+    try:
+        limit = chunk_limit(max_chars, max_tokens)
+    except ValueError as e:
+        raise ToolError(str(e)) from e
+    if limit is None or len(output) <= limit:
+        return output
+    return _chunk_at(await documents.put(output), output, 0, limit)
+
+
+def _chunk_at(doc_id, text, offset, limit):
+    chunk, next_offset = split_chunk(text, offset, limit)
+    if next_offset is None:
+        return chunk
+    metrics.incr("documents.chunks_served")
+    cursor = encode_cursor(doc_id, next_offset, limit)
+    return (
+        f"{chunk}\n\n---\nShowing characters {offset}-{next_offset} of {len(text)}. "
+        f"Call get_next_chunk with cursor=\"{cursor}\" to read more."
+    )
+
+
+def _batch_section(url, output, error):
+    if error is None:
+        return f"# {url}\n\n{output}"
+    return f"# {url}\n\nError: {error}"
+
+
+@mcp.tool()
+async def get_youtube_transcript(url_input: str, offline: bool = False) -> str:
+    '''
+    Use this tool when you receive youtube links from the user. This tool will extract the transcript from the youtube video and return it to you. Therefore if a user asks questions on a youtube video after providing a link, you can answer their question with this tool. Videos with chapters get a heading per chapter, see get_outline.
+    Args:
+        url: The url from which you want to text to be extracted.
+        offline: Only answer from the local cache, without fetching anything.
+
+    '''
+    with offline_mode(offline):
+        output = await _serve_youtube(url_input)
     return [types.TextContent(type="text", text=output)]
 
 @mcp.tool()
-async def get_pdf(url_input: str) -> str:
+async def get_pdf(url_input: str, pages: str | None = None, max_pages: int | None = None, offline: bool = False, max_chars: int | None = None, max_tokens: int | None = None) -> str:
   
     """
     Convert a URL that leads to a PDF file to markdown text.
+    When the user only asks about part of a long document, pass `pages` or `max_pages` to convert just that part. If not every page was converted, the response ends with the pages converted and the total page count.
     
     Args:
         input_url (str): Path to the PDF file to convert
+        pages (str): Optional pages to convert, e.g. "1-5,12" or "12-" (1 based)
+        max_pages (int): Optional maximum number of pages to convert
+        offline (bool): Only answer from the local cache, without fetching anything
+        max_chars (int): Optional maximum number of characters to return; longer documents end with a cursor for get_next_chunk
+        max_tokens (int): Optional maximum number of tokens to return, like max_chars
         
         
     Returns:
@@ -77,23 +593,296 @@ async def get_pdf(url_input: str) -> str:
     
     
     
-     # Extract filename without extension
-    filename = download_pdf_from_url(url_input)
-    
-    converter = PdfConverter(
-    artifact_dict=create_model_dict(),
+    try:
+        with offline_mode(offline):
+            output = await _serve_url(url_input, "pdf", pages, max_pages)
+    except ValueError as e:
+        raise ToolError(str(e)) from e
+    output = await _paginate(output, max_chars, max_tokens)
+    return [types.TextContent(type="text", text=output)]
+
+
+@mcp.tool()
+async def fetch_url(url_input: str, offline: bool = False, max_chars: int | None = None, max_tokens: int | None = None) -> str:
+    """
+    Returns the text behind any link: a webpage, a PDF or a youtube video. Use this when you are not sure what kind of document a link points to.
+    The server checks what the link actually serves and uses the matching extractor.
+    Args:
+        url_input: The url from which you want the text to be extracted.
+        offline: Only answer from the local cache, without fetching anything.
+        max_chars: Optional maximum number of characters to return. Longer documents end with a cursor for get_next_chunk.
+        max_tokens: Optional maximum number of tokens to return, like max_chars.
+    """
+    with offline_mode(offline):
+        output = await _serve_url(url_input, "web")
+    output = await _paginate(output, max_chars, max_tokens)
+    return [types.TextContent(type="text", text=output)]
+
+
+@mcp.tool()
+async def get_next_chunk(cursor: str, max_chars: int | None = None, max_tokens: int | None = None) -> str:
+    """
+    Returns the next part of a document that was cut short by max_chars or max_tokens. The document is read from the server's copy, nothing is fetched or converted again. If the document continues, the response ends with the cursor for the part after it.
+    Args:
+        cursor: The cursor from the end of the previous response.
+        max_chars: Optional maximum number of characters to return; defaults to the size of the previous part.
+        max_tokens: Optional maximum number of tokens to return, like max_chars.
+    """
+    try:
+        doc_id, offset, limit = decode_cursor(cursor)
+        limit = chunk_limit(max_chars, max_tokens) or limit
+    except ValueError as e:
+        raise ToolError(str(e)) from e
+    text = await documents.get(doc_id)
+    if text is None:
+        raise ToolError("The document for this cursor is no longer stored, call the original tool again")
+    if offset >= len(text):
+        raise ToolError(f"Cursor offset {offset} is past the end of the document ({len(text)} characters)")
+    output = _chunk_at(doc_id, text, offset, limit)
+    return [types.TextContent(type="text", text=output)]
+
+
+async def _indexed_document(url_input, pages, max_pages, offline):
+    """
+    Serve a document like fetch_url and return it with its parsed outline.
+
+    Returns:
+        tuple: (text, sections)
+    """
+    try:
+        with offline_mode(offline):
+            text = await _serve_url(url_input, "web", pages, max_pages)
+    except ValueError as e:
+        raise ToolError(str(e)) from e
+    return text, await outlines.get(hashlib.sha256(text.encode("utf-8")).hexdigest(), text)
+
+
+@mcp.tool()
+async def get_outline(url_input: str, depth: int | None = None, pages: str | None = None, max_pages: int | None = None, offline: bool = False) -> str:
+    """
+    Returns the heading tree of a webpage, PDF or youtube video (by chapter) with an id and size in characters for each section. PDFs without headings are outlined by page. Use this before reading a long document, then call get_section with the ids of the sections that matter instead of reading everything.
+    Args:
+        url_input: The url of the document.
+        depth: Optional number of heading levels to show.
+        pages: Optional pages to convert if the url is a PDF, e.g. "1-5,12".
+        max_pages: Optional maximum number of pages to convert if the url is a PDF.
+        offline: Only answer from the local cache, without fetching anything.
+    """
+    text, sections = await _indexed_document(url_input, pages, max_pages, offline)
+    metrics.incr("outline.served")
+    output = (
+        f"Outline of {url_input} ({len(text)} chars, {len(sections)} sections). "
+        f"Pass section ids to get_section to read them.\n\n{format_outline(sections, depth)}"
     )
-    rendered = converter(filename)
-    output, _, _ = text_from_rendered(rendered)
-    os.remove(filename)
     return [types.TextContent(type="text", text=output)]
 
 
+@mcp.tool()
+async def get_section(url_input: str, section_ids: list[str], pages: str | None = None, max_pages: int | None = None, offline: bool = False, max_chars: int | None = None, max_tokens: int | None = None) -> str:
+    """
+    Returns only the chosen sections of a document, using the ids from get_outline. A section includes its subsections.
+    Args:
+        url_input: The url of the document.
+        section_ids: Ids of the sections to return, e.g. ["2", "3.1"].
+        pages: Optional pages to convert if the url is a PDF; must match the get_outline call.
+        max_pages: Optional maximum number of pages to convert if the url is a PDF; must match the get_outline call.
+        offline: Only answer from the local cache, without fetching anything.
+        max_chars: Optional maximum number of characters to return. Longer output ends with a cursor for get_next_chunk.
+        max_tokens: Optional maximum number of tokens to return, like max_chars.
+    """
+    if not section_ids:
+        raise ToolError("section_ids is required, get the ids with get_outline")
+    text, sections = await _indexed_document(url_input, pages, max_pages, offline)
+    try:
+        output = select_sections(text, sections, section_ids)
+    except ValueError as e:
+        raise ToolError(f"{e}. Call get_outline for the ids of {url_input}") from e
+    metrics.incr("outline.sections_served", len(section_ids))
+    output = await _paginate(output, max_chars, max_tokens)
+    return [types.TextContent(type="text", text=output)]
+
+
+# Jobs run at background priority so they never hold up interactive calls
+async def _pdf_job(url_input, pages=None, max_pages=None):
+    with priority(BACKGROUND):
+        return await _serve_url(url_input, "pdf", pages, max_pages)
+
+
+async def _fetch_job(url_input):
+    with priority(BACKGROUND):
+        return await _serve_url(url_input, "web")
+
+
+async def _batch_job(urls, max_concurrency, time_budget):
+    sections = []
+    with priority(BACKGROUND):
+        async for url, output, error in _fetch_webpages(urls, max_concurrency, time_budget):
+            sections.append(_batch_section(url, output, error))
+    return "\n\n".join(sections)
+
+
+@mcp.tool()
+async def submit_job(kind: str, url_input: str = "", urls: list[str] | None = None, pages: str | None = None, max_pages: int | None = None, max_concurrency: int = 8, time_budget: float = 600) -> str:
+    """
+    Start long running work in the background and return a job id right away. Use this for large PDFs or many webpages, where a direct call could time out. Check on the job with job_status and read its output with job_result.
+    Args:
+        kind: "pdf" to convert a PDF, "fetch" for any single link, or "batch" for several webpages.
+        url_input: The url for "pdf" and "fetch" jobs.
+        urls: The urls for "batch" jobs.
+        pages: Optional pages to convert for "pdf" jobs, e.g. "1-5,12".
+        max_pages: Optional maximum number of pages to convert for "pdf" jobs.
+        max_concurrency: How many pages a "batch" job loads at the same time.
+        time_budget: Total number of seconds a "batch" job may take.
+    """
+    if kind == "pdf":
+        params = {"url_input": url_input, "pages": pages, "max_pages": max_pages}
+    elif kind == "fetch":
+        params = {"url_input": url_input}
+    elif kind == "batch":
+        params = {"urls": urls or [], "max_concurrency": max_concurrency, "time_budget": time_budget}
+    else:
+        raise ToolError(f"Unknown job kind {kind!r}, expected one of {', '.join(job_queue.kinds)}")
+    if kind != "batch" and not url_input:
+        raise ToolError(f"url_input is required for {kind!r} jobs")
+    if kind == "batch" and not urls:
+        raise ToolError("urls is required for 'batch' jobs")
+    status = job_queue.submit(kind, params)
+    return [types.TextContent(type="text", text=json.dumps(status, indent=2))]
+
+
+@mcp.tool()
+async def job_status(job_id: str) -> str:
+    """
+    Returns the state of a job started with submit_job: queued, running, done or failed, with timestamps and the size of the result.
+    Args:
+        job_id: The id returned by submit_job.
+    """
+    try:
+        status = job_queue.status(job_id)
+    except ValueError as e:
+        raise ToolError(str(e)) from e
+    return [types.TextContent(type="text", text=json.dumps(status, indent=2))]
+
+
+@mcp.tool()
+async def job_result(job_id: str, offset: int = 0, max_chars: int = 100000) -> str:
+    """
+    Returns the output of a finished job. Long outputs are returned in pieces; if the output continues, the response ends with the offset to pass to read the next piece.
+    Args:
+        job_id: The id returned by submit_job.
+        offset: Character offset to start reading from.
+        max_chars: Maximum number of characters to return.
+    """
+    try:
+        text, next_offset = job_queue.result(job_id, offset, max_chars)
+    except ValueError as e:
+        raise ToolError(str(e)) from e
+    if next_offset is not None:
+        text += f"\n\n---\nOutput continues. Call job_result with offset={next_offset} to read more."
+    return [types.TextContent(type="text", text=text)]
+
+
+@mcp.tool()
+async def get_server_stats() -> str:
+    """
+    Returns cache hit/miss counters and other server metrics as JSON.
+    """
+    stats = {
+        "counters": metrics.snapshot(),
+        "cache": result_cache.stats(),
+        "lanes": scheduler.stats(),
+    }
+    return [types.TextContent(type="text", text=json.dumps(stats, indent=2))]
+
+
+
+def _open_stores():
+    """
+    Set up the cache, the on-disk stores and the job queue. This runs when
+    the server starts rather than at import, so importing the module stays
+    cheap, also in the PDF worker processes that re-import it.
+    """
+    global result_cache, pdf_store, documents, job_queue
+    result_cache = ResultCache(
+        directory=config.CACHE_DIR,
+        memory_limit=config.CACHE_MEMORY_LIMIT,
+        ttls=config.CACHE_TTLS,
+    )
+    if config.CACHE_DIR:
+        pdf_store = ContentStore(
+            directory=os.path.join(config.CACHE_DIR, "pdf"),
+            max_bytes=config.PDF_STORE_LIMIT,
+            metric="pdf_store",
+        )
+    documents = DocumentStore(
+        memory_limit=config.DOCUMENT_MEMORY_LIMIT,
+        store=ContentStore(
+            directory=os.path.join(config.CACHE_DIR, "documents"),
+            max_bytes=config.DOCUMENT_STORE_LIMIT,
+            metric="documents.disk",
+        ) if config.CACHE_DIR else None,
+    )
+    job_queue = JobQueue(
+        directory=os.path.join(config.CACHE_DIR, "jobs") if config.CACHE_DIR else None,
+        ttl=config.JOB_TTL,
+        workers=config.JOB_WORKERS,
+    )
+    job_queue.register("pdf", _pdf_job)
+    job_queue.register("fetch", _fetch_job)
+    job_queue.register("batch", _batch_job)
+
+
+async def _prewarm_crawler_pool():
+    try:
+        await crawler_pool.start()
+    except Exception as e:
+        print(f"Error prewarming crawler pool: {e}", file=sys.stderr)
+
+
+async def main():
+    # Heavy dependencies are only imported when first needed so the server can
+    # answer `initialize` right away; prewarming happens in the background.
+    _open_stores()
+    if config.PRELOAD_PDF_MODELS and not config.OFFLINE:
+        pdf_workers.prewarm()
+    if not config.OFFLINE:
+        # Offline, expired results are still the best answer there is
+        result_cache.prune(
+            max_stale=config.MAX_STALE if config.STALE_WHILE_REVALIDATE else 0,
+            keep_validated=config.VALIDATED_RETENTION,
+        )
+    # Offline, unfinished jobs would only fail on cache misses; they are
+    # picked up again by the next online start
+    await job_queue.start(resume=not config.OFFLINE)
+    prewarm_task = None
+    if config.PREWARM_BROWSERS and not config.OFFLINE:
+        prewarm_task = asyncio.create_task(_prewarm_crawler_pool())
+    try:
+        await mcp.run_stdio_async()
+    finally:
+        if prewarm_task is not None:
+            await prewarm_task
+        await job_queue.close()
+        await refresher.close()
+        # Browsers are only torn down when the server exits
+        await crawler_pool.close()
+        await close_client()
+        pdf_workers.shutdown()
+        result_cache.close()
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Webscraper MCP server")
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="answer only from the local cache and never touch the network",
+    )
+    if parser.parse_args().offline:
+        config.OFFLINE = True
     try:
         # Initialize and run the server
-        mcp.run(transport='stdio')
+        asyncio.run(main())
     except Exception as e:
         print(f"Error initializing or running MCP server: {e}", file=sys.stderr) # PRINT TO STDERR!
         sys.exit(1)  # Exit with a non-zero code to indicate an error
\ No newline at end of file